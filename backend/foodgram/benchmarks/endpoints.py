@@ -0,0 +1,408 @@
+"""
+Time every endpoint of recipes/urls.py and users/urls.py in-process on
+data generated by seedbench and write a JSON report with latency
+percentiles and query counts, to be diffed between commits.
+
+Usage: python -m benchmarks.endpoints [--users 200] [--recipes 2000]
+           [--repeat 20] [--output report.json]
+
+Runs against a throwaway test database of tests.settings_qa; set
+DJANGO_SETTINGS_MODULE to benchmark another database.
+"""
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from . import utils
+
+IMAGE = (
+    'data:image/png;base64,'
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGNgYGAAAAAEAAH2'
+    'FzhVAAAAAElFTkSuQmCC'
+)
+CREATED_NAME = 'benchmark created recipe'
+BULK_SIZE = 20
+
+# Endpoints that send email, need one-time tokens or mostly hash
+# passwords say nothing about the code of this project.
+SKIPPED = {
+    'users:user-activation': 'needs an activation token',
+    'users:user-resend-activation': 'sends email',
+    'users:user-reset-password': 'sends email',
+    'users:user-reset-password-confirm': 'needs a reset token',
+    'users:user-reset-username': 'sends email',
+    'users:user-reset-username-confirm': 'needs a reset token',
+    'users:user-set-password': 'dominated by password hashing',
+    'users:user-set-username': 'needs the current password',
+    'recipes:api-root': 'static',
+    'users:api-root': 'static',
+}
+
+
+class Endpoint(NamedTuple):
+    url_name: str
+    label: str
+    method: str
+    authorized: bool
+    # Untimed preparation; returns the path and the request body.
+    prepare: Callable[[], Tuple[str, Optional[dict]]]
+
+    @property
+    def key(self):
+        role = 'user' if self.authorized else 'anonymous'
+        parts = (self.method, self.url_name, self.label, f'({role})')
+        return ' '.join(part for part in parts if part)
+
+
+class Scenario:
+    """
+    Objects the requests are made on, picked from seedbench data, and
+    factories of the untimed preparation of every request.
+    """
+
+    def __init__(self):
+        from django.contrib.auth import get_user_model
+        from recipes.models import (FavoriteRecipe, Ingredient, Recipe,
+                                    ShoppingCartRecipe, Tag)
+        from users.models import Follow
+
+        users = get_user_model().objects.filter(username__startswith='bench_')
+        # The busiest author has recipes, follows, favorites and a cart.
+        self.user = users.order_by('-recipes_count', 'pk').first()
+        collected = set()
+        for model in (FavoriteRecipe, ShoppingCartRecipe):
+            collected.update(
+                model.objects.for_user(self.user.pk)
+                .values_list('recipe', flat=True)
+            )
+        free_ids = list(
+            Recipe.objects.exclude(author=self.user)
+            .exclude(pk__in=collected)
+            .order_by('pk').values_list('pk', flat=True)[:BULK_SIZE + 1]
+        )
+        if len(free_ids) <= BULK_SIZE:
+            raise ValueError(
+                f'{BULK_SIZE + 1} recipes outside the collections of '
+                f'{self.user} are needed, generate more --recipes.'
+            )
+        self.recipe = Recipe.objects.get(pk=free_ids[0])
+        self.bulk_ids = free_ids[1:]
+        self.own_recipe = Recipe.objects.filter(
+            author=self.user,
+        ).order_by('pk').first()
+        # With few users the busiest one follows everybody; unfollow one.
+        others = users.exclude(pk=self.user.pk).order_by('pk')
+        self.other = others.exclude(
+            pk__in=self.user.follows.values('pk'),
+        ).first() or others.first()
+        Follow.objects.filter(from_user=self.user, to_user=self.other).delete()
+        self.tags = list(Tag.objects.order_by('pk')[:2])
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)[:5]
+        )
+
+    @staticmethod
+    def url(name, query='', **kwargs):
+        from django.urls import reverse
+
+        path = reverse(name, kwargs=kwargs or None)
+        return lambda: (f'{path}?{query}' if query else path, None)
+
+    def payload(self, name):
+        return {
+            'name': name,
+            'text': 'text',
+            'cooking_time': 10,
+            'image': IMAGE,
+            'tags': [self.tags[0].id],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 5}
+                for ingredient_id in self.ingredient_ids
+            ],
+        }
+
+    def create_recipe(self):
+        from django.urls import reverse
+        from recipes.models import Recipe
+
+        Recipe.objects.filter(name=CREATED_NAME).delete()
+        return reverse('recipes:recipe-list'), self.payload(CREATED_NAME)
+
+    def update_recipe(self):
+        from django.urls import reverse
+
+        path = reverse(
+            'recipes:recipe-detail', kwargs={'pk': self.own_recipe.pk},
+        )
+        name = f'benchmark updated recipe {time.perf_counter_ns()}'
+        return path, self.payload(name)
+
+    def delete_recipe(self):
+        from django.urls import reverse
+        from recipes.models import Recipe, RecipeIngredient
+
+        recipe = Recipe.objects.create(
+            author=self.user,
+            name=f'benchmark deleted recipe {time.perf_counter_ns()}',
+            text='text',
+            cooking_time=5,
+        )
+        recipe.tags.add(self.tags[0])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient_id=pk, amount=1)
+            for pk in self.ingredient_ids
+        )
+        return reverse('recipes:recipe-detail', kwargs={'pk': recipe.pk}), None
+
+    def toggle(self, name, model, adding):
+        from django.urls import reverse
+
+        def prepare():
+            if adding:
+                model.objects.discard(self.user.pk, self.recipe.pk)
+            else:
+                model.objects.add(self.user.pk, self.recipe.pk)
+            return reverse(name, kwargs={'pk': self.recipe.pk}), None
+        return prepare
+
+    def toggle_many(self, name, model, adding):
+        from django.urls import reverse
+
+        def prepare():
+            if adding:
+                model.objects.discard_many(self.user.pk, self.bulk_ids)
+            else:
+                model.objects.add_many(self.user.pk, self.bulk_ids)
+            return reverse(name), {'recipes': self.bulk_ids}
+        return prepare
+
+    def subscribe(self, adding):
+        from django.urls import reverse
+        from users.models import Follow
+
+        def prepare():
+            follows = Follow.objects.filter(
+                from_user=self.user, to_user=self.other,
+            )
+            if adding:
+                follows.delete()
+            elif not follows.exists():
+                Follow.objects.create(from_user=self.user, to_user=self.other)
+            return reverse(
+                'users:user-subscribe', kwargs={'id': self.other.pk},
+            ), None
+        return prepare
+
+
+def make_endpoints(scenario):
+    from recipes.models import FavoriteRecipe, ShoppingCartRecipe
+
+    url = scenario.url
+    tags = '&'.join(f'tags={tag.slug}' for tag in scenario.tags)
+    endpoints = [
+        Endpoint('recipes:tag-list', '', 'GET', False,
+                 url('recipes:tag-list')),
+        Endpoint('recipes:tag-detail', '', 'GET', False,
+                 url('recipes:tag-detail', pk=scenario.tags[0].pk)),
+        Endpoint('recipes:ingredient-list', '', 'GET', False,
+                 url('recipes:ingredient-list')),
+        Endpoint('recipes:ingredient-list', 'search', 'GET', False,
+                 url('recipes:ingredient-list', 'name=мо')),
+        Endpoint('recipes:ingredient-detail', '', 'GET', False,
+                 url('recipes:ingredient-detail',
+                     pk=scenario.ingredient_ids[0])),
+        Endpoint('recipes:recipe-list', '', 'GET', False,
+                 url('recipes:recipe-list')),
+        Endpoint('recipes:recipe-list', '', 'GET', True,
+                 url('recipes:recipe-list')),
+        Endpoint('recipes:recipe-list', 'filtered', 'GET', True,
+                 url('recipes:recipe-list', f'{tags}&is_favorited=1')),
+        Endpoint('recipes:recipe-list', 'cursor', 'GET', True,
+                 url('recipes:recipe-list', 'pagination=cursor')),
+        Endpoint('recipes:recipe-list', 'search', 'GET', True,
+                 url('recipes:recipe-list', 'search=тесто')),
+        Endpoint('recipes:recipe-list', 'create', 'POST', True,
+                 scenario.create_recipe),
+        Endpoint('recipes:recipe-detail', '', 'GET', False,
+                 url('recipes:recipe-detail', pk=scenario.recipe.pk)),
+        Endpoint('recipes:recipe-detail', '', 'GET', True,
+                 url('recipes:recipe-detail', pk=scenario.recipe.pk)),
+        Endpoint('recipes:recipe-detail', 'update', 'PUT', True,
+                 scenario.update_recipe),
+        Endpoint('recipes:recipe-detail', 'delete', 'DELETE', True,
+                 scenario.delete_recipe),
+    ]
+    collections = (
+        ('recipes:recipe-favorite', FavoriteRecipe),
+        ('recipes:recipe-shopping-cart', ShoppingCartRecipe),
+    )
+    for name, model in collections:
+        endpoints += [
+            Endpoint(name, '', 'GET', True,
+                     scenario.toggle(name, model, True)),
+            Endpoint(name, '', 'DELETE', True,
+                     scenario.toggle(name, model, False)),
+            Endpoint(f'{name}-many', '', 'POST', True,
+                     scenario.toggle_many(f'{name}-many', model, True)),
+            Endpoint(f'{name}-many', '', 'DELETE', True,
+                     scenario.toggle_many(f'{name}-many', model, False)),
+        ]
+    endpoints += [
+        Endpoint('recipes:recipe-download-shopping-cart', export_format,
+                 'GET', True,
+                 url('recipes:recipe-download-shopping-cart',
+                     f'format={export_format}'))
+        for export_format in ('txt', 'csv', 'pdf')
+    ]
+    endpoints += [
+        Endpoint('users:user-list', '', 'GET', False,
+                 url('users:user-list')),
+        Endpoint('users:user-list', '', 'GET', True, url('users:user-list')),
+        Endpoint('users:user-detail', '', 'GET', True,
+                 url('users:user-detail', id=scenario.other.pk)),
+        Endpoint('users:user-me', '', 'GET', True, url('users:user-me')),
+        Endpoint('users:user-subscriptions', '', 'GET', True,
+                 url('users:user-subscriptions', 'recipes_limit=3')),
+        Endpoint('users:user-subscribe', '', 'GET', True,
+                 scenario.subscribe(True)),
+        Endpoint('users:user-subscribe', '', 'DELETE', True,
+                 scenario.subscribe(False)),
+    ]
+    return endpoints
+
+
+def call(client, endpoint):
+    """Prepare and send one request; return status, milliseconds, queries."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    path, data = endpoint.prepare()
+    method = getattr(client, endpoint.method.lower())
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = method(path, data, format='json')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - started) * 1000
+    return response.status_code, elapsed, len(queries)
+
+
+def run(endpoint, clients, repeat):
+    client = clients[endpoint.authorized]
+    # The first call warms process caches, it is reported apart.
+    status, cold, cold_queries = call(client, endpoint)
+    timings, query_counts = [], []
+    for _ in range(repeat):
+        status, elapsed, queries = call(client, endpoint)
+        timings.append(elapsed)
+        query_counts.append(queries)
+    return {
+        'status': status,
+        'cold_ms': round(cold, 3),
+        'cold_queries': cold_queries,
+        **{f'{name}_ms': round(value, 3)
+           for name, value in utils.summarize(timings).items()},
+        'queries': max(query_counts),
+    }
+
+
+def get_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def find_uncovered(endpoints):
+    from recipes import urls as recipes_urls
+    from users import urls as users_urls
+
+    names = {
+        f'{module.app_name}:{pattern.name}'
+        for module in (recipes_urls, users_urls)
+        for pattern in module.urlpatterns
+    }
+    covered = {endpoint.url_name for endpoint in endpoints}
+    return sorted(names - covered - set(SKIPPED))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--recipes', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report here.')
+    args = parser.parse_args()
+
+    utils.setup()
+    media_root = tempfile.mkdtemp()
+    with utils.test_database():
+        import django
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+
+        with override_settings(MEDIA_ROOT=media_root):
+            call_command(
+                'seedbench', users=args.users, recipes=args.recipes,
+                seed=args.seed,
+            )
+            try:
+                scenario = Scenario()
+            except ValueError as error:
+                parser.error(str(error))
+            clients = {False: APIClient(), True: APIClient()}
+            clients[True].force_authenticate(scenario.user)
+            endpoints = make_endpoints(scenario)
+            results = {
+                endpoint.key: run(endpoint, clients, args.repeat)
+                for endpoint in endpoints
+            }
+        vendor = connection.vendor
+    shutil.rmtree(media_root, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'revision': get_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': vendor,
+            'users': args.users,
+            'recipes': args.recipes,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'endpoints': results,
+        'skipped': SKIPPED,
+        'uncovered': find_uncovered(endpoints),
+    }
+    utils.print_report(
+        f'{len(results)} endpoints, {args.repeat} calls each',
+        {
+            key: {
+                'min': result['min_ms'],
+                'median': result['median_ms'],
+                'mean': result['mean_ms'],
+                'queries': result['queries'],
+            }
+            for key, result in results.items()
+        },
+    )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fp:
+            json.dump(report, fp, indent=2, sort_keys=True, ensure_ascii=False)
+            fp.write('\n')
+
+
+if __name__ == '__main__':
+    main()
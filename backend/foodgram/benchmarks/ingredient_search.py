@@ -0,0 +1,117 @@
+"""
+Compare ingredient prefix search through the database with the
+in-process ingredient index, and time typo-tolerant trigram search.
+
+Usage: python -m benchmarks.ingredient_search [--ingredients PATH]
+"""
+import argparse
+import json
+import os
+import random
+
+from . import utils
+
+DEFAULT_INGREDIENTS = os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', 'data', 'ingredients.json'
+)
+
+
+def load_ingredients(path):
+    from recipes.models import Ingredient
+
+    with open(path, encoding='utf-8') as fp:
+        data = json.load(fp)
+    Ingredient.objects.bulk_create(
+        Ingredient(**ingredient) for ingredient in data
+    )
+    return [ingredient['name'] for ingredient in data]
+
+
+def make_queries(names, count, seed):
+    """Prefixes as typed keystroke by keystroke into autocomplete."""
+    rng = random.Random(seed)
+    return [
+        name[:length]
+        for name in rng.sample(names, count)
+        for length in range(1, min(len(name), 6) + 1)
+    ]
+
+
+def make_typos(names, count, seed):
+    """Names with one letter dropped, as typed in a hurry."""
+    rng = random.Random(seed)
+    typos = []
+    for name in rng.sample(names, count):
+        position = rng.randrange(len(name))
+        typos.append(name[:position] + name[position + 1:])
+    return typos
+
+
+def database_search(queries, limit):
+    from recipes.models import Ingredient
+    from recipes.serializers import IngredientSerializer
+
+    # Same rows as the index returns: the first limit matches by name.
+    for query in queries:
+        IngredientSerializer(
+            Ingredient.objects.filter(
+                name__istartswith=query,
+            ).order_by('name')[:limit],
+            many=True,
+        ).data
+
+
+def index_search(queries, limit):
+    from recipes.search import ingredient_index
+
+    for query in queries:
+        ingredient_index.search(query, limit)
+
+
+def similar_search(queries, limit):
+    from recipes.search import ingredient_index
+
+    for query in queries:
+        ingredient_index.search_similar(query, limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--ingredients', default=DEFAULT_INGREDIENTS)
+    parser.add_argument('--words', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    utils.setup()
+    with utils.test_database():
+        from recipes.search import ingredient_index
+
+        names = load_ingredients(args.ingredients)
+        queries = make_queries(names, args.words, args.seed)
+        ingredient_index.build()
+        _, database_report = utils.measure(
+            lambda: database_search(queries, args.limit), args.repeat,
+        )
+        _, index_report = utils.measure(
+            lambda: index_search(queries, args.limit), args.repeat,
+        )
+        utils.print_report(
+            f'{len(queries)} prefix queries over {len(names)} ingredients',
+            {'database': database_report, 'index': index_report},
+        )
+        typos = make_typos(names, args.words, args.seed)
+        _, similar_report = utils.measure(
+            lambda: similar_search(typos, args.limit), args.repeat,
+        )
+        utils.print_report(
+            f'{len(typos)} fuzzy queries over {len(names)} ingredients',
+            {'trigram': similar_report},
+        )
+        print(f'{similar_report["median"] / len(typos):.3f} ms '
+              f'per fuzzy query')
+
+
+if __name__ == '__main__':
+    main()
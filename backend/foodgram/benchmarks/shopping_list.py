@@ -0,0 +1,105 @@
+"""
+Compare shopping list aggregation in Python with the database one.
+
+Usage: python -m benchmarks.shopping_list [--recipes 500]
+"""
+import argparse
+import random
+from collections import defaultdict, namedtuple
+
+from . import utils
+
+
+def legacy_ingredients_to_buy(shopping_cart):
+    """Shopping list aggregation as it was done before GROUP BY / SUM."""
+    from recipes.models import RecipeIngredient
+
+    ingredients = (
+        RecipeIngredient.objects
+        .filter(recipe__in=shopping_cart.recipes.all())
+        .select_related('ingredient').all()
+    )
+    IngredientTuple = namedtuple(  # noqa: N806
+        'IngredientTuple', 'name measurement_unit',
+    )
+    counter = defaultdict(int)
+
+    for ingredient in ingredients:
+        counter[
+            IngredientTuple(
+                ingredient.ingredient.name,
+                ingredient.ingredient.measurement_unit
+            )
+        ] += ingredient.amount
+    return [(ingredient.name, amount, ingredient.measurement_unit)
+            for ingredient, amount in counter.items()]
+
+
+def populate(recipes_count, ingredients_per_recipe, seed):
+    from django.contrib.auth import get_user_model
+    from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                                ShoppingCartRecipe, UserShoppingCart)
+
+    rng = random.Random(seed)
+    user = get_user_model().objects.create(
+        username='bench', email='bench@bench.com',
+    )
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'ingredient {i}', measurement_unit='г')
+        for i in range(max(ingredients_per_recipe, 300))
+    )
+    ingredient_ids = list(
+        Ingredient.objects.values_list('id', flat=True)[:len(ingredients)]
+    )
+    Recipe.objects.bulk_create(
+        Recipe(author=user, name=f'recipe {i}', text='', cooking_time=1)
+        for i in range(recipes_count)
+    )
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe_id=recipe_id,
+            ingredient_id=ingredient_id,
+            amount=rng.randint(1, 500),
+        )
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(
+            ingredient_ids, ingredients_per_recipe
+        )
+    )
+    shopping_cart = UserShoppingCart.objects.create(user=user)
+    ShoppingCartRecipe.objects.bulk_create(
+        ShoppingCartRecipe(shopping_cart=shopping_cart, recipe_id=recipe_id)
+        for recipe_id in recipe_ids
+    )
+    return shopping_cart
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=500)
+    parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    utils.setup()
+    with utils.test_database():
+        shopping_cart = populate(
+            args.recipes, args.ingredients_per_recipe, args.seed
+        )
+        legacy, legacy_report = utils.measure(
+            lambda: legacy_ingredients_to_buy(shopping_cart), args.repeat,
+        )
+        current, current_report = utils.measure(
+            lambda: list(shopping_cart.get_ingredients_to_buy()), args.repeat,
+        )
+        assert sorted(legacy) == current, 'Aggregation results differ.'
+        utils.print_report(
+            f'Shopping list for a {args.recipes}-recipe cart',
+            {'python': legacy_report, 'database': current_report},
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import contextlib
+import math
+import os
+import statistics
+import time
+
+import django
+
+
+def setup(settings_module='tests.settings_qa'):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    django.setup()
+
+
+@contextlib.contextmanager
+def test_database():
+    """Run the benchmark against a throwaway test database."""
+    from django.db import connection
+    from django.test.utils import (setup_test_environment,
+                                   teardown_test_environment)
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=10):
+    """
+    Call func repeat times and return timings in milliseconds together
+    with the number of queries of a single call.
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as queries:
+        result = func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'queries': len(queries),
+    }
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(timings):
+    """Latency statistics of timings in milliseconds."""
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'p90': percentile(timings, 90),
+        'p95': percentile(timings, 95),
+        'p99': percentile(timings, 99),
+        'max': max(timings),
+    }
+
+
+def print_report(title, reports):
+    width = max([12] + [len(name) + 2 for name in reports])
+    print(title)
+    print(f'{"":<{width}}{"min, ms":>12}{"median, ms":>12}'
+          f'{"mean, ms":>12}{"queries":>10}')
+    for name, report in reports.items():
+        print(f'{name:<{width}}{report["min"]:>12.2f}'
+              f'{report["median"]:>12.2f}{report["mean"]:>12.2f}'
+              f'{report["queries"]:>10}')
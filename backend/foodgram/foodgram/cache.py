@@ -0,0 +1,240 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+
+from django.utils.module_loading import import_string
+
+
+class BaseStore:
+    """
+    Byte store with size- and age-based eviction and hit/miss counters.
+
+    max_size limits total size of stored values in bytes, max_age limits
+    lifetime of a value in seconds. None disables the limit.
+    """
+
+    def __init__(self, max_size: Optional[int] = None,
+                 max_age: Optional[float] = None):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if self.max_size is not None and len(value) > self.max_size:
+            return
+        self._set(key, value)
+
+    def is_expired(self, created: float) -> bool:
+        return (
+            self.max_age is not None
+            and time.time() - created > self.max_age
+        )
+
+    @property
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def _get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def _set(self, key: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+
+class MemoryLRUStore(BaseStore):
+    """Process-local store evicting least recently used values."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._data = OrderedDict()
+        self._size = 0
+
+    def _get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            created, value = self._data[key]
+            if self.is_expired(created):
+                self._delete(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def _set(self, key, value):
+        with self._lock:
+            if key in self._data:
+                self._delete(key)
+            self._data[key] = (time.time(), value)
+            self._size += len(value)
+            while self.max_size is not None and self._size > self.max_size:
+                self._delete(next(iter(self._data)))
+
+    def _delete(self, key):
+        created, value = self._data.pop(key)
+        self._size -= len(value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._size = 0
+
+
+class FileSystemStore(BaseStore):
+    """
+    Store keeping values as files in a directory, which can be shared
+    between worker processes. Least recently written files are evicted
+    first.
+
+    Writes keep a running estimate of the directory size and only scan
+    it when the estimate exceeds max_size or cull_interval seconds have
+    passed, which also picks up writes of other processes.
+    """
+
+    def __init__(self, location: str, cull_interval: float = 60, **kwargs):
+        super().__init__(**kwargs)
+        self.location = location
+        self.cull_interval = cull_interval
+        self._size: Optional[int] = None
+        self._culled = 0.0
+        os.makedirs(location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, key)
+
+    def _get(self, key):
+        path = self._path(key)
+        try:
+            if self.is_expired(os.path.getmtime(path)):
+                os.remove(path)
+                return None
+            with open(path, 'rb') as fp:
+                return fp.read()
+        except FileNotFoundError:
+            return None
+
+    def _set(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, prefix='.')
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(value)
+        os.replace(tmp_path, self._path(key))
+        with self._lock:
+            if self._size is not None:
+                self._size += len(value)
+            now = time.monotonic()
+            due = (
+                self._size is None
+                or now - self._culled >= self.cull_interval
+                or self.max_size is not None and self._size > self.max_size
+            )
+            if due:
+                self._culled = now
+        if due:
+            size = self._cull()
+            with self._lock:
+                self._size = size
+
+    def _entries(self):
+        with os.scandir(self.location) as entries:
+            return [
+                entry for entry in entries
+                if entry.is_file() and not entry.name.startswith('.')
+            ]
+
+    def _cull(self) -> int:
+        """Remove expired and least recently written files; return size."""
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if self.is_expired(stat.st_mtime):
+                self._remove(entry.path)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(entry_size for _, entry_size, _ in entries)
+        if self.max_size is None:
+            return size
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            self._remove(path)
+            size -= entry_size
+        return size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for entry in self._entries():
+            self._remove(entry.path)
+        with self._lock:
+            self._size = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller runs
+    the function, the others wait for it and get the same result or
+    exception instead of repeating the work.
+    """
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return the result of func() and whether this call ran it."""
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = self.Call()
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+        try:
+            call.result = func()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, True
+
+
+def get_store(config: dict) -> BaseStore:
+    """Build store from a {'BACKEND': ..., 'OPTIONS': {...}} setting."""
+    store_class = import_string(config['BACKEND'])
+    return store_class(**config.get('OPTIONS', {}))
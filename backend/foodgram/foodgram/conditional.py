@@ -0,0 +1,64 @@
+import hashlib
+from datetime import datetime
+from typing import Optional, Tuple
+
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+Validators = Tuple[str, Optional[datetime]]
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+class ConditionalGetMixin:
+    """
+    Answer If-None-Match / If-Modified-Since requests to list and retrieve
+    with 304 Not Modified before the view queries or serializes anything.
+
+    Views return (etag, last_modified) from get_validators(); None skips
+    the check. cache_control and vary are applied to 200 and 304 responses.
+    """
+    cache_control = {'no_cache': True}
+    vary = ()
+
+    def get_validators(self) -> Optional[Validators]:
+        return None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        validators = self.get_validators()
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = validators
+        timestamp = None
+        if last_modified is not None:
+            timestamp = int(last_modified.timestamp())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp,
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code not in (200, 304):
+            return response
+
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_cache_control(response, **self.cache_control)
+        if self.vary:
+            patch_vary_headers(response, self.vary)
+        return response
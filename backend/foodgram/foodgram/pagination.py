@@ -1,6 +1,76 @@
-from rest_framework.pagination import PageNumberPagination
+from django.db import connections
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Keyset pagination for infinite scroll. Total count is skipped unless
+    requested with ?count=exact or ?count=approximate.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-created', '-id')
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = self.get_count(
+            queryset, request.query_params.get(self.count_query_param)
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    @staticmethod
+    def get_count(queryset, mode):
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'approximate':
+            return estimate_count(queryset)
+        return None
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.count is not None:
+            response.data['count'] = self.count
+        return response
+
+
+class RecipePagination(CustomPageNumberPagination):
+    """
+    Page number pagination, which switches to cursor pagination when
+    requested with ?pagination=cursor.
+    """
+    mode_query_param = 'pagination'
+    cursor_pagination_class = CustomCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+def estimate_count(queryset):
+    """
+    Return the planner's row estimate on Postgres instead of running
+    COUNT(*). Other databases get an exact count.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return plan[0]['Plan']['Plan Rows']
@@ -0,0 +1,92 @@
+import hashlib
+from functools import lru_cache
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.translation import get_language
+
+from .cache import BaseStore, SingleFlight, get_store
+
+single_flight = SingleFlight()
+
+
+@lru_cache(maxsize=None)
+def get_response_cache(setting_name: str) -> BaseStore:
+    return get_store(getattr(settings, setting_name))
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Serve list and retrieve responses for anonymous users from a store
+    configured by the response_cache_setting setting.
+
+    Keys combine the normalized URL, language, renderer and the value of
+    get_cache_version(), so bumping the version retires every cached
+    response at once. Concurrent misses for the same key in a process
+    render the response once.
+    """
+    response_cache_setting = None
+
+    def get_cache_version(self) -> str:
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_cache_key(self, request) -> str:
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        parts = (
+            request.build_absolute_uri(request.path),
+            query,
+            get_language() or '',
+            request.accepted_renderer.format,
+            self.get_cache_version(),
+        )
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if (
+            not request.user.is_anonymous
+            or request.accepted_renderer.format != 'json'
+        ):
+            return handler(request, *args, **kwargs)
+        store = get_response_cache(self.response_cache_setting)
+        key = self.get_cache_key(request)
+        content = store.get(key)
+        if content is not None:
+            return self.make_cached_response(request, content, 'HIT')
+
+        def render():
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return None, response
+            response = self.finalize_response(
+                request, response, *args, **kwargs
+            )
+            response.render()
+            store.set(key, response.content)
+            return response.content, response
+
+        (content, response), is_leader = single_flight.do(key, render)
+        if is_leader:
+            response['X-Cache'] = 'MISS'
+            return response
+        if content is None:
+            return handler(request, *args, **kwargs)
+        return self.make_cached_response(request, content, 'COALESCED')
+
+    @staticmethod
+    def make_cached_response(request, content, status):
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = HttpResponse(content, content_type=content_type)
+        response['X-Cache'] = status
+        return response
@@ -16,12 +16,14 @@ ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '*').split(',')
 INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'recipes.apps.RecipesConfig',
+    'jobs.apps.JobsConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -29,6 +31,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -149,6 +152,125 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Stream multipart uploads to disk instead of keeping them in memory.
+FILE_UPLOAD_HANDLERS = (
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+)
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024)
+)
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.getenv('RECIPE_IMAGE_MAX_PIXELS', 40 * 1000 * 1000)
+)
+
+# Maximum number of recipe ids accepted by bulk favorite and cart requests.
+RECIPE_BULK_MAX_SIZE = int(os.getenv('RECIPE_BULK_MAX_SIZE', 100))
+
+JOBS = {
+    'MAX_ATTEMPTS': int(os.getenv('JOBS_MAX_ATTEMPTS', 5)),
+    # Seconds before the first retry, doubled on every next one.
+    'BACKOFF': int(os.getenv('JOBS_BACKOFF', 10)),
+    # Seconds after which a running job is considered abandoned.
+    'TIMEOUT': int(os.getenv('JOBS_TIMEOUT', 10 * 60)),
+}
+
+RECIPE_IMAGE_VARIANTS = {
+    # Variant name and its maximum width in pixels.
+    'SIZES': {
+        'card': 480,
+        'detail': 960,
+        'retina': 1920,
+    },
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': 80,
+}
+
+# Seconds browsers and nginx may reuse tag and ingredient lists before
+# revalidating them with If-None-Match.
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 60))
+
+CATALOG_CACHE = {
+    # Seconds between checks whether other workers changed tags or
+    # ingredients. None disables the check.
+    'CHECK_INTERVAL': float(os.getenv('CATALOG_CACHE_CHECK_INTERVAL', 5)),
+}
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+INGREDIENT_FUZZY_SEARCH = {
+    # 'memory' uses the in-process trigram index, 'database' uses pg_trgm.
+    'BACKEND': os.getenv('INGREDIENT_FUZZY_SEARCH_BACKEND', 'memory'),
+    'THRESHOLD': 0.3,
+}
+
+SHOPPING_LIST_PDF_CACHE = {
+    'BACKEND': os.getenv(
+        'SHOPPING_LIST_PDF_CACHE_BACKEND', 'foodgram.cache.MemoryLRUStore'
+    ),
+    'OPTIONS': {
+        'max_size': int(
+            os.getenv('SHOPPING_LIST_PDF_CACHE_MAX_SIZE', 32 * 1024 * 1024)
+        ),
+        'max_age': int(
+            os.getenv('SHOPPING_LIST_PDF_CACHE_MAX_AGE', 24 * 60 * 60)
+        ),
+    },
+}
+
+# Responses to anonymous recipe list and detail requests. Entries are
+# keyed by the recipes data version, max_age bounds how stale counters
+# and author details in them may get.
+RECIPE_RESPONSE_CACHE = {
+    'BACKEND': os.getenv(
+        'RECIPE_RESPONSE_CACHE_BACKEND', 'foodgram.cache.MemoryLRUStore'
+    ),
+    'OPTIONS': {
+        'max_size': int(
+            os.getenv('RECIPE_RESPONSE_CACHE_MAX_SIZE', 64 * 1024 * 1024)
+        ),
+        'max_age': int(os.getenv('RECIPE_RESPONSE_CACHE_MAX_AGE', 60)),
+    },
+}
+
+# Query count, SQL, serializer and renderer time of a SAMPLE_RATE share
+# of requests go to the Server-Timing header (if HEADER) and, for requests
+# slower than SLOW_REQUEST_MS, to the foodgram.timing log together with
+# up to MAX_SLOW_QUERIES statements slower than SLOW_QUERY_MS.
+SERVER_TIMING = {
+    'ENABLED': os.getenv('SERVER_TIMING', default='False').lower() == 'true',
+    'SAMPLE_RATE': float(os.getenv('SERVER_TIMING_SAMPLE_RATE', 1)),
+    'HEADER': True,
+    'SLOW_REQUEST_MS': float(os.getenv('SERVER_TIMING_SLOW_REQUEST_MS', 500)),
+    'SLOW_QUERY_MS': float(os.getenv('SERVER_TIMING_SLOW_QUERY_MS', 50)),
+    'MAX_SLOW_QUERIES': 5,
+}
+
+# Slow requests reported by foodgram.timing are logged at INFO; structured
+# fields are passed as extra for log processors to pick up.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'verbose',
+        },
+    },
+    'loggers': {
+        'foodgram.timing': {
+            'handlers': ['console'],
+            'level': os.getenv('SERVER_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
 LOCALE_PATHS = (
     '/locale/',
 )
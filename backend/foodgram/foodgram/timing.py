@@ -0,0 +1,178 @@
+import heapq
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+MAX_SQL_LENGTH = 1000
+
+
+class RequestTimings:
+    """Durations collected while one sampled request is handled, in ms."""
+
+    def __init__(self, max_slow_queries: int, slow_query_ms: float):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.slow_queries: List[Tuple[float, int, str]] = []
+        self.max_slow_queries = max_slow_queries
+        self.slow_query_ms = slow_query_ms
+        self.serializing = False
+        self.render_started: Optional[float] = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            self.queries += 1
+            self.db += duration
+            if duration >= self.slow_query_ms and self.max_slow_queries:
+                # The query number keeps equal durations from comparing SQL.
+                item = (duration, self.queries, sql[:MAX_SQL_LENGTH])
+                if len(self.slow_queries) < self.max_slow_queries:
+                    heapq.heappush(self.slow_queries, item)
+                else:
+                    heapq.heappushpop(self.slow_queries, item)
+
+    @property
+    def total(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def start_render(self) -> None:
+        self.render_started = time.perf_counter()
+
+    def finish_render(self, response) -> None:
+        if self.render_started is not None:
+            self.render += (time.perf_counter() - self.render_started) * 1000
+            self.render_started = None
+
+    def slowest(self) -> List[dict]:
+        return [
+            {'duration_ms': round(duration, 3), 'sql': sql}
+            for duration, _number, sql in sorted(
+                self.slow_queries, reverse=True
+            )
+        ]
+
+    def header(self, total: float) -> str:
+        return ', '.join((
+            f'db;dur={self.db:.3f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize:.3f}',
+            f'render;dur={self.render:.3f}',
+            f'total;dur={total:.3f}',
+        ))
+
+
+current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    'current_timings', default=None
+)
+
+
+def timed_data(data: property) -> property:
+    """
+    Wrap a serializer data property to add its duration to the timings of
+    the current request. Serializers nested through .data of another
+    serializer are only counted once, as part of the outer one.
+    """
+    def get_data(serializer):
+        timings = current_timings.get()
+        if timings is None or timings.serializing:
+            return data.fget(serializer)
+        timings.serializing = True
+        started = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            timings.serialize += (time.perf_counter() - started) * 1000
+            timings.serializing = False
+
+    get_data.timed = True
+    return property(get_data)
+
+
+def instrument_serializers() -> None:
+    # DRF has no hook around serializer output; both Serializer.data and
+    # ListSerializer.data go through BaseSerializer.data.
+    if not getattr(BaseSerializer.data.fget, 'timed', False):
+        BaseSerializer.data = timed_data(BaseSerializer.data)
+
+
+class ServerTimingMiddleware:
+    """
+    Report query count, SQL, serializer and renderer time of sampled
+    requests in the Server-Timing header and the foodgram.timing log.
+
+    Configured with settings.SERVER_TIMING; when it is disabled Django
+    drops the middleware and serializers are left untouched.
+    """
+
+    def __init__(self, get_response):
+        config = settings.SERVER_TIMING
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config['SAMPLE_RATE']
+        self.header = config['HEADER']
+        self.slow_request_ms = config['SLOW_REQUEST_MS']
+        self.slow_query_ms = config['SLOW_QUERY_MS']
+        self.max_slow_queries = config['MAX_SLOW_QUERIES']
+        instrument_serializers()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        timings = RequestTimings(self.max_slow_queries, self.slow_query_ms)
+        token = current_timings.set(timings)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = timings.total
+        if self.header:
+            response['Server-Timing'] = timings.header(total)
+        if total >= self.slow_request_ms:
+            self.log(request, response, timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called right before DRF responses are rendered.
+        timings = current_timings.get()
+        if timings is not None:
+            timings.start_render()
+            response.add_post_render_callback(timings.finish_render)
+        return response
+
+    @staticmethod
+    def log(request, response, timings: RequestTimings, total: float):
+        logger.info(
+            '%s %s %s in %.1fms, %d queries in %.1fms',
+            request.method, request.path, response.status_code, total,
+            timings.queries, timings.db,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'total_ms': round(total, 3),
+                'db_ms': round(timings.db, 3),
+                'queries': timings.queries,
+                'serialize_ms': round(timings.serialize, 3),
+                'render_ms': round(timings.render, 3),
+                'slow_queries': timings.slowest(),
+            },
+        )
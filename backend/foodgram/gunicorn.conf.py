@@ -0,0 +1,14 @@
+def post_worker_init(worker):
+    """
+    Fill the tag and ingredient caches and the ingredient search index
+    before the worker accepts its first request.
+    """
+    from django.db import DatabaseError, connections
+    from recipes.catalog import catalog
+
+    try:
+        catalog.preload()
+    except DatabaseError:
+        worker.log.exception('Catalog preload failed, loading lazily')
+    finally:
+        connections.close_all()
@@ -0,0 +1,23 @@
+from django.contrib import admin
+from django.utils.translation import gettext_lazy as _
+
+from .models import Job
+
+EMPTY_VALUE_MESSAGE = _('-empty-')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'status',
+        'attempts',
+        'run_at',
+        'finished',
+    )
+    list_filter = (
+        'status',
+        'name',
+    )
+    empty_value_display = EMPTY_VALUE_MESSAGE
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+from django.utils.translation import gettext_lazy as _
+
+
+class JobsConfig(AppConfig):
+    name = 'jobs'
+    verbose_name = _('Background jobs')
+
+    def ready(self):
+        autodiscover_modules('tasks')
@@ -0,0 +1,39 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from jobs.queue import Worker
+
+
+class Command(BaseCommand):
+    help = 'Runs background jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of jobs run at the same time.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1,
+            help='Seconds to wait before checking an empty queue again.',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once there are no due jobs.',
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            concurrency=options['concurrency'],
+            poll_interval=options['poll_interval'],
+            burst=options['burst'],
+        )
+        if not options['burst']:
+            signal.signal(signal.SIGTERM, worker.stop)
+            signal.signal(signal.SIGINT, worker.stop)
+        worker.run()
+        self.stdout.write(f'Processed {worker.processed} jobs')
@@ -0,0 +1,69 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+
+class Job(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', _('Pending')
+        RUNNING = 'running', _('Running')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+
+    name = models.CharField(
+        verbose_name=_('Task name'),
+        max_length=255,
+    )
+    payload = models.JSONField(
+        verbose_name=_('Payload'),
+        default=dict,
+        blank=True,
+    )
+    status = models.CharField(
+        verbose_name=_('Status'),
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name=_('Attempts'),
+        default=0,
+    )
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name=_('Max attempts'),
+    )
+    run_at = models.DateTimeField(
+        verbose_name=_('Run at'),
+        default=timezone.now,
+    )
+    locked_at = models.DateTimeField(
+        verbose_name=_('Locked at'),
+        null=True,
+        blank=True,
+    )
+    last_error = models.TextField(
+        verbose_name=_('Last error'),
+        blank=True,
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+    )
+    finished = models.DateTimeField(
+        verbose_name=_('Finished'),
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = _('Job')
+        verbose_name_plural = _('Jobs')
+        ordering = ('run_at', 'id')
+        indexes = (
+            models.Index(
+                name='job_status_run_at_idx',
+                fields=('status', 'run_at'),
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.name} #{self.pk} ({self.status})'
@@ -0,0 +1,193 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry: Dict[str, 'Task'] = {}
+
+
+class Task:
+    """Function that can be run later by a worker with a JSON payload."""
+
+    def __init__(self, func: Callable, name: str,
+                 max_attempts: Optional[int] = None):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, **payload):
+        return self.func(**payload)
+
+    def enqueue(self, run_at=None, **payload) -> Job:
+        """
+        Store a job for the task. Jobs enqueued inside a transaction
+        become visible to workers only after it commits.
+        """
+        return Job.objects.create(
+            name=self.name,
+            payload=payload,
+            max_attempts=(
+                self.max_attempts or settings.JOBS['MAX_ATTEMPTS']
+            ),
+            run_at=run_at or timezone.now(),
+        )
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """
+    Register a function as a task. The name defaults to
+    '<module>.<function>' and has to stay stable while jobs for it exist.
+    """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = Task(func, task_name, max_attempts)
+        return registry[task_name]
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def get_backoff(attempts: int) -> timedelta:
+    """Exponential delay before the next attempt of a failed job."""
+    return timedelta(seconds=settings.JOBS['BACKOFF'] * 2 ** (attempts - 1))
+
+
+def claim_job() -> Optional[Job]:
+    """
+    Lock the next due job and mark it as running.
+
+    SKIP LOCKED lets concurrent workers pass over rows claimed by others
+    instead of waiting for them. Jobs left running longer than TIMEOUT,
+    e.g. by a killed worker, are claimed again, or marked failed once
+    they used up their attempts, so a job that keeps crashing its worker
+    is not retried forever.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS['TIMEOUT'])
+    while True:
+        with transaction.atomic():
+            job = (
+                Job.objects
+                .select_for_update(skip_locked=True)
+                .filter(
+                    Q(status=Job.Status.PENDING, run_at__lte=now)
+                    | Q(status=Job.Status.RUNNING, locked_at__lt=stale)
+                )
+                .order_by('run_at', 'id')
+                .first()
+            )
+            if job is None:
+                return None
+            if (
+                job.status == Job.Status.RUNNING
+                and job.attempts >= job.max_attempts
+            ):
+                fail_timed_out_job(job, now)
+                continue
+            job.status = Job.Status.RUNNING
+            job.attempts += 1
+            job.locked_at = now
+            job.save(update_fields=('status', 'attempts', 'locked_at'))
+        return job
+
+
+def fail_timed_out_job(job: Job, now) -> None:
+    job.status = Job.Status.FAILED
+    job.finished = now
+    job.locked_at = None
+    job.last_error = (
+        f'Attempt {job.attempts} did not finish within '
+        f'{settings.JOBS["TIMEOUT"]} seconds'
+    )
+    job.save(update_fields=('status', 'finished', 'locked_at', 'last_error'))
+    logger.error('Job %s timed out on its last attempt', job)
+
+
+def run_job(job: Job) -> None:
+    task_ = registry.get(job.name)
+    try:
+        if task_ is None:
+            raise LookupError(f'Unknown task {job.name}')
+        task_(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if task_ is None or job.attempts >= job.max_attempts:
+            job.status = Job.Status.FAILED
+            job.finished = timezone.now()
+            logger.exception('Job %s failed', job)
+        else:
+            job.status = Job.Status.PENDING
+            job.run_at = timezone.now() + get_backoff(job.attempts)
+            logger.warning('Job %s will be retried at %s', job, job.run_at)
+    else:
+        job.status = Job.Status.DONE
+        job.finished = timezone.now()
+    job.locked_at = None
+    job.save(update_fields=(
+        'status', 'run_at', 'locked_at', 'last_error', 'finished',
+    ))
+
+
+class Worker:
+    """
+    Run due jobs in a number of threads until stopped.
+
+    In burst mode a thread exits as soon as there are no due jobs left.
+    """
+
+    def __init__(self, concurrency: int = 1, poll_interval: float = 1,
+                 burst: bool = False):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.stopped = threading.Event()
+        self.processed = 0
+        self._lock = threading.Lock()
+
+    def stop(self, *args) -> None:
+        self.stopped.set()
+
+    def work(self) -> None:
+        while not self.stopped.is_set():
+            close_old_connections()
+            job = claim_job()
+            if job is None:
+                if self.burst:
+                    break
+                self.stopped.wait(self.poll_interval)
+                continue
+            run_job(job)
+            with self._lock:
+                self.processed += 1
+
+    def work_in_thread(self) -> None:
+        try:
+            self.work()
+        finally:
+            connection.close()
+
+    def run(self) -> None:
+        if self.concurrency == 1:
+            self.work()
+            return
+        threads = [
+            threading.Thread(
+                target=self.work_in_thread, name=f'worker-{number}',
+            )
+            for number in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
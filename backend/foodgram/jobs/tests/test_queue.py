@@ -0,0 +1,99 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from ..models import Job
+from ..queue import claim_job, run_job, task
+
+calls = []
+
+
+@task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.fail', max_attempts=3)
+def fail():
+    raise ValueError('boom')
+
+
+@override_settings(JOBS={'MAX_ATTEMPTS': 5, 'BACKOFF': 10, 'TIMEOUT': 60})
+class TestJobQueue(TestCase):
+    def setUp(self) -> None:
+        calls.clear()
+
+    def test_run(self):
+        job = record.enqueue(value=1)
+        self.assertEqual(job.max_attempts, 5)
+
+        out = StringIO()
+        call_command('runworker', burst=True, stdout=out)
+
+        job.refresh_from_db()
+        self.assertEqual(calls, [1])
+        self.assertEqual(job.status, Job.Status.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.finished)
+        self.assertIn('Processed 1 jobs', out.getvalue())
+
+    def test_retry_with_backoff(self):
+        job = fail.enqueue()
+        delays = []
+        for attempt in range(1, 4):
+            claimed = claim_job()
+            self.assertEqual(claimed.pk, job.pk)
+            self.assertEqual(claimed.attempts, attempt)
+            started = timezone.now()
+            run_job(claimed)
+            job.refresh_from_db()
+            delays.append(round((job.run_at - started).total_seconds()))
+            self.assertIsNone(claim_job())
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn('ValueError: boom', job.last_error)
+        self.assertEqual(delays[:2], [10, 20])
+
+    def test_unknown_task(self):
+        job = Job.objects.create(name='tests.missing', max_attempts=5)
+        run_job(claim_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertEqual(job.attempts, 1)
+
+    def test_claim_order(self):
+        now = timezone.now()
+        record.enqueue(run_at=now + timedelta(minutes=1), value=1)
+        stale = record.enqueue(value=2)
+        Job.objects.filter(pk=stale.pk).update(
+            status=Job.Status.RUNNING,
+            locked_at=now - timedelta(minutes=5),
+        )
+        running = record.enqueue(value=3)
+        Job.objects.filter(pk=running.pk).update(
+            status=Job.Status.RUNNING, locked_at=now,
+        )
+
+        self.assertEqual(claim_job().pk, stale.pk)
+        self.assertIsNone(claim_job())
+
+    def test_stale_job_without_attempts_left_fails(self):
+        job = record.enqueue(value=1)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.Status.RUNNING,
+            attempts=5,
+            locked_at=timezone.now() - timedelta(minutes=5),
+        )
+        pending = record.enqueue(value=2)
+
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            self.assertEqual(claim_job().pk, pending.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIsNone(job.locked_at)
+        self.assertIn('did not finish', job.last_error)
+        self.assertIsNone(claim_job())
@@ -22,8 +22,26 @@ class ShoppingCartInLine(admin.TabularInline):
     extra = 1
 
 
+class RecipeCollectionAdmin(admin.ModelAdmin):
+    def save_formset(self, request, form, formset, change):
+        """
+        Recount recipes added to or removed from the collection through
+        its inline, which bypasses the counter updates of the API.
+        """
+        super().save_formset(request, form, formset, change)
+        recipe_ids = set()
+        for inline_form in formset.forms:
+            recipe_ids.add(inline_form.initial.get('recipe'))
+            recipe = inline_form.cleaned_data.get('recipe')
+            if recipe is not None:
+                recipe_ids.add(recipe.pk)
+        recipe_ids.discard(None)
+        if recipe_ids:
+            formset.model.objects.recount(recipe_ids)
+
+
 @admin.register(UserFavorites)
-class UserFavoriteAdmin(admin.ModelAdmin):
+class UserFavoriteAdmin(RecipeCollectionAdmin):
     list_display = (
         'user',
         'get_recipes',
@@ -45,7 +63,7 @@ class UserFavoriteAdmin(admin.ModelAdmin):
 
 
 @admin.register(UserShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(RecipeCollectionAdmin):
     list_display = (
         'user',
         'get_recipes',
@@ -107,7 +125,7 @@ class RecipeAdmin(admin.ModelAdmin):
     get_ingredients.short_description = _('Ingredients')
 
     def get_added_to_favorites(self, obj):
-        return FavoriteRecipe.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     get_added_to_favorites.short_description = _('Added to favorites')
 
@@ -5,3 +5,6 @@ from django.utils.translation import gettext_lazy as _
 class RecipesConfig(AppConfig):
     name = 'recipes'
     verbose_name = _('Recipes')
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,128 @@
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import DataVersion, Ingredient, Tag
+from .search import ingredient_index
+
+
+class CatalogState(NamedTuple):
+    version: int
+    updated: Optional[datetime]
+    objects: Dict[int, object]
+    data: Dict[int, dict]
+    ordered_data: List[dict]
+
+
+class CachedTable:
+    """
+    Process-local copy of a small, rarely changed table: model instances
+    and their serialized representations, keyed by primary key.
+
+    The copy is tagged with the table's DataVersion. Writes in this
+    process drop it at once; writes made by other workers are noticed by
+    comparing versions at most every CATALOG_CACHE['CHECK_INTERVAL']
+    seconds. Cached instances are shared and must not be modified.
+    """
+
+    def __init__(self, name: str, model, serializer: str,
+                 on_load: Optional[Callable[[List[dict]], None]] = None):
+        self.name = name
+        self.model = model
+        self.serializer = serializer
+        self.on_load = on_load
+        self._state: Optional[CatalogState] = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    def __deepcopy__(self, memo):
+        # Serializer fields holding the table are deep-copied per instance,
+        # the cache itself has to stay shared.
+        return self
+
+    def load(self) -> CatalogState:
+        version, updated = DataVersion.objects.get_version(self.name)
+        objects = list(self.model.objects.all())
+        serializer_class = import_string(self.serializer)
+        ordered_data = [
+            dict(item)
+            for item in serializer_class(objects, many=True).data
+        ]
+        state = CatalogState(
+            version=version,
+            updated=updated,
+            objects={obj.pk: obj for obj in objects},
+            data={item['id']: item for item in ordered_data},
+            ordered_data=ordered_data,
+        )
+        with self._lock:
+            self._state = state
+            self._checked_at = time.monotonic()
+        if self.on_load is not None:
+            self.on_load(ordered_data)
+        return state
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._state = None
+
+    def is_stale(self, state: CatalogState) -> bool:
+        interval = settings.CATALOG_CACHE['CHECK_INTERVAL']
+        if interval is None or time.monotonic() - self._checked_at < interval:
+            return False
+        version, _ = DataVersion.objects.get_version(self.name)
+        self._checked_at = time.monotonic()
+        return version != state.version
+
+    def get_state(self) -> CatalogState:
+        state = self._state
+        if state is not None and not self.is_stale(state):
+            return state
+        with self._lock:
+            if self._state is not None and self._state is not state:
+                return self._state
+            return self.load()
+
+    def get_many(self, pks: Iterable[int]) -> Dict[int, object]:
+        objects = self.get_state().objects
+        return {pk: objects[pk] for pk in pks if pk in objects}
+
+    def get_data(self, pk: int) -> Optional[dict]:
+        return self.get_state().data.get(pk)
+
+    def all_data(self) -> List[dict]:
+        return self.get_state().ordered_data
+
+
+class Catalog:
+    def __init__(self):
+        self.tags = CachedTable(
+            DataVersion.TAGS, Tag, 'recipes.serializers.TagExplicitSerializer',
+        )
+        self.ingredients = CachedTable(
+            DataVersion.INGREDIENTS,
+            Ingredient,
+            'recipes.serializers.IngredientSerializer',
+            on_load=ingredient_index.build,
+        )
+
+    def __getitem__(self, name: str) -> CachedTable:
+        return {
+            DataVersion.TAGS: self.tags,
+            DataVersion.INGREDIENTS: self.ingredients,
+        }[name]
+
+    def preload(self) -> None:
+        self.tags.load()
+        self.ingredients.load()
+
+    def invalidate(self) -> None:
+        self.tags.invalidate()
+        self.ingredients.invalidate()
+
+
+catalog = Catalog()
@@ -0,0 +1,105 @@
+import csv
+import hashlib
+import io
+import json
+from functools import lru_cache
+from typing import Iterable, Iterator, Sequence, Tuple
+
+from django.conf import settings
+from django.utils.translation import gettext as _
+from foodgram.cache import get_store
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Table
+
+FONT_NAME = 'DejaVu Serif'
+FONT_FILE = 'DejaVuSerif.ttf'
+
+CSV_HEADER = ('name', 'amount', 'measurement_unit')
+
+DEFAULT_EXPORT_FORMAT = 'pdf'
+EXPORT_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+IngredientRow = Tuple[str, int, str]
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    """Parse and register PDF font once per process."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_FILE))
+
+
+@lru_cache(maxsize=None)
+def get_pdf_cache():
+    return get_store(settings.SHOPPING_LIST_PDF_CACHE)
+
+
+def get_cache_key(ingredients: Sequence[IngredientRow], locale: str) -> str:
+    content = json.dumps([locale, ingredients], ensure_ascii=False)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def render_shopping_list_pdf(ingredients: Sequence[IngredientRow]) -> bytes:
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer)
+    register_fonts()
+    if ingredients:
+        table = Table(
+            ingredients,
+            hAlign='LEFT',
+            style=[
+                ('FONT', (0, 0), (-1, -1), FONT_NAME),
+                ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+                ('ALIGN', (2, 0), (2, -1), 'LEFT'),
+            ]
+        )
+        doc.build([table])
+    else:
+        doc.build([Paragraph(_('Shopping cart is empty.'))])
+    return buffer.getvalue()
+
+
+def get_shopping_list_pdf(ingredients: Sequence[IngredientRow],
+                          locale: str) -> bytes:
+    """
+    Return shopping list PDF, rendering it only if the same list was not
+    rendered for the same locale before.
+    """
+    cache = get_pdf_cache()
+    key = get_cache_key(ingredients, locale)
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render_shopping_list_pdf(ingredients)
+        cache.set(key, pdf)
+    return pdf
+
+
+def iter_shopping_list_text(
+        ingredients: Iterable[IngredientRow]) -> Iterator[str]:
+    is_empty = True
+    for name, amount, measurement_unit in ingredients:
+        is_empty = False
+        yield f'{name} — {amount} {measurement_unit}\n'
+    if is_empty:
+        yield _('Shopping cart is empty.') + '\n'
+
+
+class _LineBuffer:
+    """File-like object returning what is written to it."""
+
+    @staticmethod
+    def write(value):
+        return value
+
+
+def iter_shopping_list_csv(
+        ingredients: Iterable[IngredientRow]) -> Iterator[str]:
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(CSV_HEADER)
+    for row in ingredients:
+        yield writer.writerow(row)
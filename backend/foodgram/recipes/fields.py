@@ -0,0 +1,120 @@
+import binascii
+import re
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+from rest_framework import serializers
+
+from .images import FORMATS, get_srcset
+
+BASE64_CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r'\s+')
+
+
+class RecipeImageField(serializers.ImageField):
+    """
+    Image field accepting both multipart file uploads and base64 data URIs.
+
+    Base64 strings are decoded chunk by chunk into a named temporary file,
+    which Django validates from its path, so the decoded image never has to
+    be held in memory next to the request body.
+    File size and pixel count are checked against RECIPE_IMAGE_MAX_SIZE and
+    RECIPE_IMAGE_MAX_PIXELS before the image is decoded.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Please upload a valid image.',
+        'max_size': 'Image size must not exceed {max_size} bytes.',
+        'max_pixels': 'Image must not have more than {max_pixels} pixels.',
+    }
+
+    def to_internal_value(self, data):
+        decoded = isinstance(data, str)
+        if decoded:
+            data = self.decode_base64(data)
+        try:
+            self.check_size(getattr(data, 'size', None))
+            image_format = self.check_pixels(data)
+        except serializers.ValidationError:
+            if decoded:
+                data.close()
+            raise
+        extension = 'jpg' if image_format == 'jpeg' else image_format
+        data.name = f'{uuid.uuid4()}.{extension}'
+        return super().to_internal_value(data)
+
+    def check_size(self, size):
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if size is not None and size > max_size:
+            self.fail('max_size', max_size=max_size)
+
+    def check_pixels(self, data):
+        """Read image dimensions from its header and return its format."""
+        try:
+            with Image.open(data) as image:
+                width, height = image.size
+                image_format = image.format.lower()
+        except Exception:
+            self.fail('invalid_image')
+        finally:
+            data.seek(0)
+        max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+        if width * height > max_pixels:
+            self.fail('max_pixels', max_pixels=max_pixels)
+        return image_format
+
+    def decode_base64(self, data):
+        if data.startswith('data:') and ';base64,' in data:
+            _, data = data.split(';base64,', 1)
+        if WHITESPACE.search(data):
+            data = WHITESPACE.sub('', data)
+        # Every 4 base64 characters decode to 3 bytes.
+        self.check_size(len(data) // 4 * 3 - data.count('=', -2))
+
+        upload = TemporaryUploadedFile(
+            'image', 'application/octet-stream', 0, None,
+        )
+        try:
+            for start in range(0, len(data), BASE64_CHUNK_SIZE):
+                upload.write(binascii.a2b_base64(
+                    data[start:start + BASE64_CHUNK_SIZE]
+                ))
+        except binascii.Error:
+            upload.close()
+            self.fail('invalid_base64')
+        upload.size = upload.tell()
+        upload.seek(0)
+        return upload
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Represent resized image variants as URLs per size and format plus
+    ready-made srcset strings for every format.
+    """
+
+    def to_representation(self, variants):
+        if not variants:
+            return None
+        request = self.context.get('request')
+
+        def build_url(name):
+            url = default_storage.url(name)
+            if request is None:
+                return url
+            return request.build_absolute_uri(url)
+
+        representation = {}
+        for size_name, variant in variants.items():
+            if size_name == 'source':
+                continue
+            representation[size_name] = {
+                key: build_url(value) if key in FORMATS else value
+                for key, value in variant.items()
+            }
+        representation['srcset'] = get_srcset(variants, build_url)
+        return representation
@@ -1,52 +1,60 @@
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import OrderingFilter
 
-from .models import Recipe, Tag, UserFavorites, UserShoppingCart
+from .catalog import catalog
+from .models import Recipe
+
+
+def get_tag_choices():
+    return [(tag['slug'], tag['name']) for tag in catalog.tags.all_data()]
 
 
 class RecipeFilter(filters.FilterSet):
+    search = filters.CharFilter(
+        method='search_filter',
+    )
     is_favorited = filters.BooleanFilter(
         method='is_favorited_filter',
     )
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter',
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
         field_name='tags__slug',
-        to_field_name='slug',
     )
 
-    def is_favorited_filter(self, queryset, name, is_favorited):
-        user = self.request.user
-        if user.is_anonymous:
-            favorite_recipes = {}
-        else:
-            favorites, created = UserFavorites.objects.prefetch_related(
-                'recipes'
-            ).get_or_create(user=user)
-            favorite_recipes = favorites.recipes.all()
-        if not is_favorited:
-            return queryset.exclude(id__in=favorite_recipes)
-        return queryset.filter(id__in=favorite_recipes)
-
-    def is_in_shopping_cart_filter(self, queryset, name, is_in_shopping_cart):
-        user = self.request.user
-        if user.is_anonymous:
-            shopping_cart_recipes = {}
-        else:
-            shopping_cart, created = UserShoppingCart.objects.prefetch_related(
-                'recipes'
-            ).get_or_create(user=user)
-            shopping_cart_recipes = shopping_cart.recipes.all()
-        if not is_in_shopping_cart:
-            return queryset.exclude(id__in=shopping_cart_recipes)
-        return queryset.filter(id__in=shopping_cart_recipes)
+    @staticmethod
+    def search_filter(queryset, name, text):
+        return queryset.search(text)
 
-    class Meta:
-        model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+    @staticmethod
+    def is_favorited_filter(queryset, name, is_favorited):
+        return queryset.filter(is_favorited=is_favorited)
 
+    @staticmethod
+    def is_in_shopping_cart_filter(queryset, name, is_in_shopping_cart):
+        return queryset.filter(is_in_shopping_cart=is_in_shopping_cart)
 
-class IngredientSearchFilter(SearchFilter):
-    search_param = 'name'
+    class Meta:
+        model = Recipe
+        fields = (
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart', 'search',
+        )
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    Order search results by relevance unless ordering is requested
+    explicitly.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        if (
+            self.ordering_param not in request.query_params
+            and 'search_rank' in queryset.query.annotations
+        ):
+            return queryset.order_by(
+                '-search_rank', *self.get_default_ordering(view)
+            )
+        return super().filter_queryset(request, queryset, view)
@@ -0,0 +1,101 @@
+import io
+import os
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+VARIANTS_DIR = 'recipes/images/variants/'
+
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def get_variant_name(image_name: str, size_name: str, image_format: str):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    extension = FORMATS[image_format][1]
+    return f'{VARIANTS_DIR}{stem}_{size_name}.{extension}'
+
+
+def encode(image: Image.Image, image_format: str) -> bytes:
+    pil_format = FORMATS[image_format][0]
+    if pil_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        pil_format,
+        quality=settings.RECIPE_IMAGE_VARIANTS['QUALITY'],
+        optimize=True,
+    )
+    return buffer.getvalue()
+
+
+def generate_variants(image_name: str, storage=default_storage) -> dict:
+    """
+    Render resized copies of an image for every configured width and
+    format and save them next to the original.
+
+    Return a description of the variants to be kept in
+    Recipe.image_variants: names of the stored files and their sizes,
+    keyed by variant name, plus the name of the source image.
+    """
+    config = settings.RECIPE_IMAGE_VARIANTS
+    with storage.open(image_name, 'rb') as fp:
+        with Image.open(fp) as original:
+            original = ImageOps.exif_transpose(original)
+            original.load()
+
+    variants = {'source': image_name}
+    for size_name, width in config['SIZES'].items():
+        image = original.copy()
+        image.thumbnail((width, width * 4), Image.LANCZOS)
+        variant = {'width': image.width, 'height': image.height}
+        for image_format in config['FORMATS']:
+            name = get_variant_name(image_name, size_name, image_format)
+            if storage.exists(name):
+                storage.delete(name)
+            variant[image_format] = storage.save(
+                name, ContentFile(encode(image, image_format))
+            )
+        variants[size_name] = variant
+    return variants
+
+
+def iter_variant_files(variants: dict) -> Iterable[str]:
+    for size_name, variant in variants.items():
+        if size_name == 'source':
+            continue
+        for image_format in FORMATS:
+            if image_format in variant:
+                yield variant[image_format]
+
+
+def delete_files(names: Iterable[str], storage=default_storage) -> None:
+    for name in names:
+        storage.delete(name)
+
+
+def delete_stale_variants(old_variants: dict, variants: dict,
+                          storage=default_storage) -> None:
+    """Delete files of old_variants which are not reused by variants."""
+    stale = set(iter_variant_files(old_variants))
+    stale.difference_update(iter_variant_files(variants))
+    delete_files(stale, storage)
+
+
+def get_srcset(variants: dict, build_url) -> Dict[str, str]:
+    """Build srcset strings per format, e.g. 'a.webp 480w, b.webp 960w'."""
+    srcset = {}
+    for image_format in settings.RECIPE_IMAGE_VARIANTS['FORMATS']:
+        srcset[image_format] = ', '.join(
+            f'{build_url(variants[size_name][image_format])} '
+            f'{variants[size_name]["width"]}w'
+            for size_name in settings.RECIPE_IMAGE_VARIANTS['SIZES']
+            if image_format in variants.get(size_name, {})
+        )
+    return srcset
@@ -0,0 +1,102 @@
+import json
+from collections import defaultdict
+from typing import Iterator
+
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe, RecipeIngredient
+
+
+def iter_recipe_records(batch_size: int) -> Iterator[dict]:
+    """
+    Yield recipes as importrecipes records, reading them in primary key
+    order with three queries per batch_size recipes.
+    """
+    last_pk = 0
+    while True:
+        recipes = list(
+            Recipe.objects
+            .filter(pk__gt=last_pk)
+            .order_by('pk')
+            .values(
+                'pk', 'name', 'text', 'cooking_time', 'image',
+                'author__email',
+            )[:batch_size]
+        )
+        if not recipes:
+            return
+        recipe_ids = [recipe['pk'] for recipe in recipes]
+        last_pk = recipe_ids[-1]
+
+        tags = defaultdict(list)
+        for recipe_id, slug in (
+            Recipe.tags.through.objects
+            .filter(recipe_id__in=recipe_ids)
+            .order_by('id')
+            .values_list('recipe_id', 'tag__slug')
+        ):
+            tags[recipe_id].append(slug)
+        ingredients = defaultdict(list)
+        for recipe_id, name, measurement_unit, amount in (
+            RecipeIngredient.objects
+            .filter(recipe_id__in=recipe_ids)
+            .order_by('id')
+            .values_list(
+                'recipe_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount',
+            )
+        ):
+            ingredients[recipe_id].append({
+                'name': name,
+                'measurement_unit': measurement_unit,
+                'amount': amount,
+            })
+
+        for recipe in recipes:
+            yield {
+                'name': recipe['name'],
+                'author': recipe['author__email'],
+                'text': recipe['text'],
+                'cooking_time': recipe['cooking_time'],
+                'image': recipe['image'],
+                'tags': tags[recipe['pk']],
+                'ingredients': ingredients[recipe['pk']],
+            }
+
+
+class Command(BaseCommand):
+    help = (
+        'Exports recipes with their tags, ingredients and image names '
+        'as NDJSON, one recipe per line'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output_file',
+            nargs='?',
+            default='-',
+            help='File to write; standard output by default.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of recipes read with one set of queries.',
+        )
+
+    def handle(self, *args, **options):
+        if options['output_file'] == '-':
+            self.export(self.stdout.write, options['batch_size'])
+            return
+        with open(options['output_file'], 'w', encoding='utf-8') as fp:
+            exported = self.export(
+                lambda line: fp.write(line + '\n'), options['batch_size']
+            )
+        self.stdout.write(f'Exported {exported} recipes')
+
+    @staticmethod
+    def export(write, batch_size: int) -> int:
+        exported = 0
+        for record in iter_recipe_records(batch_size):
+            write(json.dumps(record, ensure_ascii=False))
+            exported += 1
+        return exported
@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from recipes.images import generate_variants
+from recipes.models import Recipe
+from recipes.tasks import save_image_variants
+
+
+def render(recipe_id, image_name):
+    try:
+        return recipe_id, generate_variants(image_name), None
+    except OSError as error:
+        return recipe_id, None, str(error)
+
+
+class Command(BaseCommand):
+    help = 'Generates resized variants of recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of worker processes.',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants that already exist.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = {
+            recipe.id: recipe
+            for recipe in Recipe.objects.exclude(image='').only(
+                'id', 'image', 'image_variants',
+            )
+            if options['force']
+            or recipe.image_variants.get('source') != recipe.image.name
+        }
+        done = failed = replaced = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = [
+                executor.submit(render, recipe.id, recipe.image.name)
+                for recipe in recipes.values()
+            ]
+            for future in as_completed(futures):
+                recipe_id, variants, error = future.result()
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f'Recipe {recipe_id}: {error}')
+                    continue
+                recipe = recipes[recipe_id]
+                if save_image_variants(
+                    recipe_id, recipe.image.name, recipe.image_variants,
+                    variants,
+                ):
+                    done += 1
+                else:
+                    replaced += 1
+        self.stdout.write(f'Generated variants for {done} recipes')
+        if replaced:
+            self.stdout.write(
+                f'Skipped {replaced} recipes whose image was replaced'
+            )
+        if failed:
+            self.stdout.write(f'Failed to process {failed} recipes')
@@ -0,0 +1,346 @@
+import os
+import struct
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from PIL import Image
+from recipes.images import delete_files, generate_variants, iter_variant_files
+from recipes.models import (DataVersion, Ingredient, Recipe, RecipeIngredient,
+                            Tag)
+
+from .loadingredients import iter_ndjson
+
+User = get_user_model()
+
+PROGRESS_INTERVAL = 5
+MAX_SMALL_INTEGER = 32767
+# What PIL and storage raise for a file which is not a usable image.
+# DecompressionBombError and broken headers are not OSError.
+IMAGE_ERRORS = (
+    OSError, ValueError, SyntaxError, struct.error,
+    Image.DecompressionBombError,
+)
+
+
+class RecipeRecord(NamedTuple):
+    number: int
+    name: str
+    author: str
+    text: str
+    cooking_time: int
+    image: str
+    tag_ids: List[int]
+    ingredients: List[Tuple[int, int]]
+
+
+def store_image(name: str, media_dir: Optional[str]):
+    """
+    Copy an image from media_dir into storage under a new name, or use
+    the stored image as is without media_dir, and render its variants.
+
+    Runs in worker processes; return (stored name, variants, error).
+    Files of a failed image are deleted here, as the caller only learns
+    the names of images which succeeded.
+    """
+    stored = None
+    try:
+        if media_dir is None:
+            if not default_storage.exists(name):
+                raise ValueError(f'{name} does not exist in storage')
+            return name, generate_variants(name), None
+        root = os.path.realpath(media_dir)
+        path = os.path.realpath(os.path.join(root, name))
+        if os.path.commonpath((root, path)) != root:
+            raise ValueError(f'{name} is outside of {media_dir}')
+        if os.path.getsize(path) > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise ValueError(f'{name} is too large')
+        with open(path, 'rb') as fp:
+            with Image.open(fp) as image:
+                width, height = image.size
+                image_format = image.format.lower()
+            if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+                raise ValueError(f'{name} has too many pixels')
+            fp.seek(0)
+            extension = 'jpg' if image_format == 'jpeg' else image_format
+            upload_to = Recipe._meta.get_field('image').upload_to
+            stored = default_storage.save(
+                f'{upload_to}{uuid.uuid4()}.{extension}', File(fp),
+            )
+        return stored, generate_variants(stored), None
+    except IMAGE_ERRORS as error:
+        if stored is not None:
+            default_storage.delete(stored)
+        return None, None, str(error) or type(error).__name__
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports recipes from NDJSON written by exportrecipes. Tags and '
+        'ingredients must already exist, recipes with a name that is '
+        'already taken are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipes_file', type=str)
+        parser.add_argument(
+            '--media-dir',
+            help='Directory to copy images from, for example MEDIA_ROOT of '
+                 'the exporting site. By default images are expected to '
+                 'exist in storage already.',
+        )
+        parser.add_argument(
+            '--author',
+            help='Email of the user who becomes the author of recipes '
+                 'whose author is missing here.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of recipes written in one transaction.',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of processes decoding and resizing images.',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--batch-size and --workers must be positive.')
+        self.media_dir = options['media_dir']
+        self.workers = options['workers']
+        self.fallback_author_id = None
+        if options['author']:
+            self.fallback_author_id = User.objects.filter(
+                email=options['author'],
+            ).values_list('pk', flat=True).first()
+            if self.fallback_author_id is None:
+                raise CommandError(f'User {options["author"]} not found.')
+        self.tag_ids: Dict[str, int] = dict(
+            Tag.objects.values_list('slug', 'pk')
+        )
+        self.ingredient_ids: Dict[Tuple[str, str], int] = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit',
+            ).iterator()
+        }
+        self.started = self.reported = time.monotonic()
+        self.read = self.imported = self.existing = self.failed = 0
+
+        try:
+            with open(options['recipes_file'], encoding='utf-8') as fp:
+                self.load(fp, options['batch_size'])
+        except FileNotFoundError:
+            raise CommandError(f'File {options["recipes_file"]} not found.')
+        finally:
+            if self.imported:
+                DataVersion.objects.bump(DataVersion.RECIPES)
+        self.report(final=True)
+
+    def load(self, fp, batch_size: int) -> None:
+        with ProcessPoolExecutor(self.workers) as self.executor:
+            batch: List[RecipeRecord] = []
+            for record in iter_ndjson(fp):
+                self.read += 1
+                try:
+                    batch.append(self.parse(record))
+                except ValueError as error:
+                    self.fail(self.read, str(error))
+                    continue
+                if len(batch) >= batch_size:
+                    self.save(batch)
+                    batch = []
+            if batch:
+                self.save(batch)
+
+    def fail(self, number: int, message: str) -> None:
+        self.failed += 1
+        self.stderr.write(f'Record {number}: {message}')
+
+    def parse(self, record) -> RecipeRecord:
+        """
+        Validate a record and resolve its tags and ingredients, raising
+        ValueError if it cannot be imported.
+        """
+        if not isinstance(record, dict):
+            raise ValueError('not an object')
+        strings = ('name', 'author', 'text', 'image')
+        if not all(isinstance(record.get(key), str) for key in strings):
+            raise ValueError(f'{", ".join(strings)} must be strings')
+        name = record['name'].strip()
+        max_length = Recipe._meta.get_field('name').max_length
+        if not 0 < len(name) <= max_length or not record['image']:
+            raise ValueError('invalid name or image')
+        if not self.is_small_integer(record.get('cooking_time')):
+            raise ValueError('invalid cooking_time')
+        return RecipeRecord(
+            number=self.read,
+            name=name,
+            author=record['author'],
+            text=record['text'],
+            cooking_time=record['cooking_time'],
+            image=record['image'],
+            tag_ids=self.resolve_tags(record.get('tags')),
+            ingredients=self.resolve_ingredients(record.get('ingredients')),
+        )
+
+    def resolve_tags(self, tags) -> List[int]:
+        if (
+            not isinstance(tags, list) or not tags
+            or not all(isinstance(slug, str) for slug in tags)
+        ):
+            raise ValueError('tags must be a non-empty list of slugs')
+        unknown = [slug for slug in tags if slug not in self.tag_ids]
+        if unknown:
+            raise ValueError(f'unknown tags {unknown}')
+        return list(dict.fromkeys(self.tag_ids[slug] for slug in tags))
+
+    def resolve_ingredients(self, ingredients) -> List[Tuple[int, int]]:
+        if not isinstance(ingredients, list) or not ingredients:
+            raise ValueError('ingredients must be a non-empty list')
+        resolved = {}
+        for ingredient in ingredients:
+            if not isinstance(ingredient, dict):
+                raise ValueError('ingredients must be objects')
+            key = (ingredient.get('name'), ingredient.get('measurement_unit'))
+            if not all(isinstance(value, str) for value in key) or (
+                key not in self.ingredient_ids
+            ):
+                raise ValueError(f'unknown ingredient {key}')
+            if not self.is_small_integer(ingredient.get('amount')):
+                raise ValueError(f'invalid amount of {key}')
+            if self.ingredient_ids[key] in resolved:
+                raise ValueError(f'duplicate ingredient {key}')
+            resolved[self.ingredient_ids[key]] = ingredient['amount']
+        return list(resolved.items())
+
+    @staticmethod
+    def is_small_integer(value) -> bool:
+        return (
+            isinstance(value, int) and not isinstance(value, bool)
+            and 1 <= value <= MAX_SMALL_INTEGER
+        )
+
+    def save(self, batch: List[RecipeRecord]) -> None:
+        """
+        Write a batch of recipes: authors and taken names are looked up
+        with one query each, images are stored by the process pool, and
+        recipes, their tags and ingredients go in with three bulk INSERTs.
+        """
+        author_ids = dict(
+            User.objects.filter(
+                email__in={record.author for record in batch},
+            ).values_list('email', 'pk')
+        )
+        taken = set(
+            Recipe.objects.filter(
+                name__in=[record.name for record in batch],
+            ).values_list('name', flat=True)
+        )
+        records = []
+        for record in batch:
+            if record.name in taken:
+                self.existing += 1
+                continue
+            taken.add(record.name)
+            if author_ids.get(record.author, self.fallback_author_id) is None:
+                self.fail(record.number, f'unknown author {record.author}')
+                continue
+            records.append(record)
+
+        images = self.executor.map(
+            store_image,
+            [record.image for record in records],
+            repeat(self.media_dir),
+            chunksize=max(1, len(records) // (4 * self.workers)),
+        )
+        recipes = []
+        stored_files = []
+        try:
+            # Files are collected as results arrive, so that those stored
+            # before a worker failure are deleted with the batch.
+            for record, (image, variants, error) in zip(records, images):
+                if error is not None:
+                    self.fail(record.number, error)
+                    continue
+                if self.media_dir is not None:
+                    stored_files.append(image)
+                stored_files.extend(iter_variant_files(variants))
+                recipes.append((record, Recipe(
+                    author_id=author_ids.get(
+                        record.author, self.fallback_author_id
+                    ),
+                    name=record.name,
+                    text=record.text,
+                    cooking_time=record.cooking_time,
+                    image=image,
+                    image_variants=variants,
+                )))
+            self.write(recipes)
+        except BaseException:
+            delete_files(stored_files)
+            raise
+        self.imported += len(recipes)
+        if time.monotonic() - self.reported >= PROGRESS_INTERVAL:
+            self.report()
+
+    @staticmethod
+    @transaction.atomic
+    def write(recipes: List[Tuple[RecipeRecord, Recipe]]) -> None:
+        if not recipes:
+            return
+        Recipe.objects.bulk_create(recipe for _record, recipe in recipes)
+        # bulk_create only sets primary keys on PostgreSQL, names are
+        # unique and work everywhere.
+        recipe_ids = dict(
+            Recipe.objects.filter(
+                name__in=[recipe.name for _record, recipe in recipes],
+            ).values_list('name', 'pk')
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(
+                recipe_id=recipe_ids[record.name], tag_id=tag_id,
+            )
+            for record, _recipe in recipes
+            for tag_id in record.tag_ids
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe_ids[record.name],
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for record, _recipe in recipes
+            for ingredient_id, amount in record.ingredients
+        )
+        counts = Counter(recipe.author_id for _record, recipe in recipes)
+        for author_id, count in counts.items():
+            User.objects.filter(pk=author_id).update(
+                recipes_count=F('recipes_count') + count,
+            )
+
+    def report(self, final=False) -> None:
+        self.reported = time.monotonic()
+        elapsed = self.reported - self.started
+        rate = self.imported / elapsed if elapsed else 0
+        message = f'Imported {self.imported} recipes ({rate:.0f} recipes/s)'
+        if final:
+            message = (
+                f'{message} in {elapsed:.1f}s, skipped {self.existing} '
+                f'existing and {self.failed} invalid of {self.read} records'
+            )
+        self.stdout.write(message)
@@ -1,33 +1,247 @@
+import csv
 import json
 import os
+import re
+import time
+from typing import Iterator, List, Optional, Set, Tuple
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from recipes.models import Ingredient
+from django.db import connection
+from recipes.catalog import catalog
+from recipes.models import DataVersion, Ingredient
 
 DATA_DIR = os.path.join(settings.BASE_DIR, 'data')
 
+CHUNK_SIZE = 64 * 1024
+# Longest JSON item accepted; anything longer is treated as malformed
+# instead of being read to the end of the file.
+MAX_ITEM_SIZE = 4 * CHUNK_SIZE
+PROGRESS_INTERVAL = 5
+FORMATS = {
+    '.json': 'json',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+}
+FIELDS = ('name', 'measurement_unit')
+
+WHITESPACE = re.compile(r'\s*')
+SEPARATORS = re.compile(r'[\s,]*')
+
+Key = Tuple[str, str]
+
+
+def iter_json_array(fp, chunk_size=CHUNK_SIZE) -> Iterator[object]:
+    """
+    Yield items of a top-level JSON array, reading the file in chunks so
+    that only the item being decoded is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer, pos = '', 0
+    opened = False
+    while True:
+        pos = (SEPARATORS if opened else WHITESPACE).match(buffer, pos).end()
+        if pos < len(buffer):
+            if not opened:
+                if buffer[pos] != '[':
+                    raise CommandError('Expected a JSON array.')
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as error:
+                too_long = len(buffer) - pos > MAX_ITEM_SIZE
+                chunk = '' if too_long else fp.read(chunk_size)
+                if not chunk:
+                    raise CommandError(f'Invalid JSON: {error}')
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield item
+            continue
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            raise CommandError('Unexpected end of JSON array.')
+        buffer, pos = chunk, 0
+
+
+def iter_ndjson(fp) -> Iterator[object]:
+    for line_number, line in enumerate(fp, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as error:
+            raise CommandError(f'Line {line_number}: invalid JSON: {error}')
+
+
+def iter_csv(fp) -> Iterator[object]:
+    """Yield CSV rows; a header row naming the fields is skipped."""
+    for row in csv.reader(fp):
+        if [cell.strip() for cell in row] == list(FIELDS):
+            continue
+        yield row
+
+
+PARSERS = {
+    'json': iter_json_array,
+    'ndjson': iter_ndjson,
+    'csv': iter_csv,
+}
+
+
+def to_key(record) -> Optional[Key]:
+    """Return (name, measurement_unit) of a record, or None if invalid."""
+    if isinstance(record, dict):
+        values = [record.get(field) for field in FIELDS]
+    elif isinstance(record, list) and len(record) == len(FIELDS):
+        values = record
+    else:
+        return None
+    if not all(isinstance(value, str) for value in values):
+        return None
+    name, measurement_unit = (value.strip() for value in values)
+    # Some units in the shipped fixture are empty, names never are.
+    if not (
+        0 < len(name) <= Ingredient._meta.get_field('name').max_length
+        and len(measurement_unit)
+        <= Ingredient._meta.get_field('measurement_unit').max_length
+    ):
+        return None
+    return name, measurement_unit
+
+
+def insert_new(keys: List[Key]) -> int:
+    """
+    INSERT ingredients, skipping those that already exist, and return
+    the number of rows inserted.
+    """
+    ops = connection.ops
+    fields = [Ingredient._meta.get_field(field) for field in FIELDS]
+    inserted = 0
+    step = ops.bulk_batch_size(fields, keys) or len(keys)
+    for start in range(0, len(keys), step):
+        rows = keys[start:start + step]
+        sql = '{} {} ({}) VALUES {} {}'.format(
+            ops.insert_statement(ignore_conflicts=True),
+            ops.quote_name(Ingredient._meta.db_table),
+            ', '.join(ops.quote_name(field.column) for field in fields),
+            ', '.join(['(%s, %s)'] * len(rows)),
+            ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in rows for value in row])
+            inserted += cursor.rowcount
+    return inserted
+
 
 class Command(BaseCommand):
-    help = 'Loads ingredients from a fixture'
+    help = (
+        'Loads ingredients from a JSON array, NDJSON or CSV file. '
+        'Ingredients that already exist are left untouched, so the '
+        'command can be re-run on the same or a grown file.'
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('ingredients_file', type=str)
+        parser.add_argument(
+            '--format',
+            choices=sorted(PARSERS),
+            help='File format; guessed from the extension by default.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of ingredients inserted with one statement.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Parse the file and count new ingredients without '
+                 'writing them. Repeats further apart than --batch-size '
+                 'are counted as new.',
+        )
 
     def handle(self, *args, **options):
-        try:
-            print(options['ingredients_file'])
-            ingredients_file = os.path.join(
-                settings.BASE_DIR, options['ingredients_file']
+        path = os.path.join(settings.BASE_DIR, options['ingredients_file'])
+        file_format = options['format'] or FORMATS.get(
+            os.path.splitext(path)[1].lower()
+        )
+        if file_format is None:
+            raise CommandError(
+                'Cannot guess file format, use --format.'
             )
-            fp = open(ingredients_file, 'r')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        self.dry_run = options['dry_run']
+        self.started = self.reported = time.monotonic()
+        self.read = self.invalid = self.duplicates = self.created = 0
+
+        try:
+            with open(path, encoding='utf-8', newline='') as fp:
+                self.load(PARSERS[file_format](fp), options['batch_size'])
         except FileNotFoundError:
-            raise CommandError('Ingredients file not specified')
+            raise CommandError(f'Ingredients file {path} not found.')
+        except UnicodeDecodeError as error:
+            raise CommandError(f'Ingredients file is not UTF-8: {error}')
+
+        if not self.dry_run:
+            DataVersion.objects.bump(DataVersion.INGREDIENTS)
+            catalog.ingredients.invalidate()
+        self.report(final=True)
+
+    def load(self, records, batch_size: int) -> None:
+        # Only the current batch is kept in memory; repeats across batches
+        # and ingredients already in the database are found by the INSERT.
+        batch: List[Key] = []
+        keys: Set[Key] = set()
+        for record in records:
+            self.read += 1
+            key = to_key(record)
+            if key is None:
+                self.invalid += 1
+                self.stderr.write(f'Record {self.read}: invalid ingredient')
+                continue
+            if key in keys:
+                self.duplicates += 1
+                continue
+            keys.add(key)
+            batch.append(key)
+            if len(batch) >= batch_size:
+                self.save(batch)
+                batch, keys = [], set()
+        if batch:
+            self.save(batch)
+
+    def save(self, batch: List[Key]) -> None:
+        if self.dry_run:
+            existing = set(
+                Ingredient.objects.filter(
+                    name__in={name for name, _unit in batch},
+                ).values_list('name', 'measurement_unit')
+            )
+            created = sum(key not in existing for key in batch)
         else:
-            ingredients_data = json.load(fp)
-            ingredients = (
-                Ingredient(**ingredient_data)
-                for ingredient_data in ingredients_data
+            created = insert_new(batch)
+        self.created += created
+        self.duplicates += len(batch) - created
+        if time.monotonic() - self.reported >= PROGRESS_INTERVAL:
+            self.report()
+
+    def report(self, final=False) -> None:
+        self.reported = time.monotonic()
+        elapsed = self.reported - self.started
+        rate = self.read / elapsed if elapsed else 0
+        message = f'Processed {self.read} records ({rate:.0f} records/s)'
+        if final:
+            action = 'Would create' if self.dry_run else 'Created'
+            message = (
+                f'{message} in {elapsed:.1f}s: {action} {self.created} '
+                f'ingredients, skipped {self.duplicates} duplicates and '
+                f'{self.invalid} invalid records'
             )
-            Ingredient.objects.bulk_create(ingredients)
-            fp.close()
+        self.stdout.write(message)
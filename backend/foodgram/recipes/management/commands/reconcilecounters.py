@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from recipes.models import (FavoriteRecipe, Recipe, ShoppingCartRecipe,
+                            count_related)
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', FavoriteRecipe, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCartRecipe, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Recounts denormalized favorites, cart and recipe counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10000,
+            help='Number of rows updated in one transaction.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, counter, related_model, related_field in COUNTERS:
+            actual = count_related(related_model, related_field)
+            last_pk = model.objects.aggregate(last_pk=Max('pk'))['last_pk']
+            fixed = 0
+            for start in range(0, (last_pk or 0) + 1, batch_size):
+                with transaction.atomic():
+                    fixed += (
+                        model.objects
+                        .filter(pk__gte=start, pk__lt=start + batch_size)
+                        .exclude(**{counter: actual})
+                        .update(**{counter: actual})
+                    )
+            self.stdout.write(
+                f'{model.__name__}.{counter}: fixed {fixed} rows'
+            )
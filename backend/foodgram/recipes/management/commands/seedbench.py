@@ -0,0 +1,247 @@
+import os
+import random
+from io import StringIO
+from typing import List
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.catalog import catalog
+from recipes.models import (DataVersion, FavoriteRecipe, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCartRecipe, Tag,
+                            UserFavorites, UserShoppingCart)
+from users.models import Follow
+
+User = get_user_model()
+
+DEFAULT_INGREDIENTS = os.path.join(
+    settings.BASE_DIR, '..', '..', 'data', 'ingredients.json'
+)
+PREFIX = 'bench'
+BATCH_SIZE = 1000
+WORDS = (
+    'нарезать', 'смешать', 'обжарить', 'добавить', 'посолить', 'варить',
+    'запекать', 'тушить', 'взбить', 'остудить', 'подавать', 'сковорода',
+    'духовка', 'кастрюля', 'минут', 'до', 'готовности', 'на', 'среднем',
+    'огне', 'с', 'зеленью', 'соусом', 'тесто', 'начинка', 'слоями',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills the database with synthetic users, follows, recipes, tags, '
+        'favorites and shopping carts for benchmarks. The same seed and '
+        'counts always produce the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=12)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Authors followed by every user.',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=30,
+            help='Favorite recipes of every user.',
+        )
+        parser.add_argument(
+            '--cart', type=int, default=10,
+            help='Recipes in the shopping cart of every user.',
+        )
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=8,
+            help='Average number of ingredients in a recipe.',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--ingredients',
+            default=DEFAULT_INGREDIENTS,
+            help='Ingredients file loaded with loadingredients.',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete data from a previous run first.',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['tags'] < 1:
+            raise CommandError('At least 2 users and 1 tag are required.')
+        bench_users = User.objects.filter(username__startswith=f'{PREFIX}_')
+        if bench_users.exists():
+            if not options['clear']:
+                raise CommandError(
+                    'Benchmark data already exists, use --clear.'
+                )
+            bench_users.delete()
+            Tag.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+
+        call_command(
+            'loadingredients', options['ingredients'], stdout=StringIO(),
+            stderr=StringIO(),
+        )
+        self.rng = random.Random(options['seed'])
+        with transaction.atomic():
+            user_ids = self.create_users(options['users'])
+            tag_ids = self.create_tags(options['tags'])
+            self.create_follows(user_ids, options['follows'])
+            recipe_ids = self.create_recipes(
+                user_ids, tag_ids, options['recipes'],
+                options['ingredients_per_recipe'],
+            )
+            self.create_collections(
+                user_ids, recipe_ids, options['favorites'], options['cart'],
+            )
+        call_command('reconcilecounters', stdout=StringIO())
+        for name in (DataVersion.TAGS, DataVersion.RECIPES):
+            DataVersion.objects.bump(name)
+        catalog.invalidate()
+        self.stdout.write(
+            f'Created {len(user_ids)} users, {len(tag_ids)} tags and '
+            f'{len(recipe_ids)} recipes'
+        )
+
+    def create_users(self, count: int) -> List[int]:
+        # Hashing is slow on purpose; every user shares the same password.
+        password = make_password(PREFIX)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{PREFIX}_{i}',
+                    email=f'{PREFIX}_{i}@example.com',
+                    first_name=f'Имя {i}',
+                    last_name=f'Фамилия {i}',
+                    password=password,
+                )
+                for i in range(count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return list(
+            User.objects
+            .filter(username__startswith=f'{PREFIX}_')
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    def create_tags(self, count: int) -> List[int]:
+        colors = self.rng.sample(range(0x1000000), count)
+        Tag.objects.bulk_create(
+            Tag(
+                name=f'{PREFIX} tag {i}',
+                slug=f'{PREFIX}-{i}',
+                color=f'#{color:06X}',
+            )
+            for i, color in enumerate(colors)
+        )
+        return list(
+            Tag.objects
+            .filter(slug__startswith=f'{PREFIX}-')
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    def create_follows(self, user_ids: List[int], count: int) -> None:
+        count = min(count, len(user_ids) - 1)
+        follows = []
+        for user_id in user_ids:
+            authors = [
+                author_id
+                for author_id in self.rng.sample(user_ids, count + 1)
+                if author_id != user_id
+            ]
+            follows.extend(
+                Follow(from_user_id=user_id, to_user_id=author_id)
+                for author_id in authors[:count]
+            )
+        Follow.objects.bulk_create(follows, batch_size=BATCH_SIZE)
+
+    def create_recipes(self, user_ids: List[int], tag_ids: List[int],
+                       count: int, ingredients_per_recipe: int) -> List[int]:
+        # Few authors write most recipes, as on any real site.
+        weights = [1 / rank for rank in range(1, len(user_ids) + 1)]
+        authors = self.rng.choices(user_ids, weights, k=count)
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=f'{PREFIX} recipe {i}',
+                    text=' '.join(self.rng.choices(WORDS, k=60)),
+                    cooking_time=self.rng.randint(5, 180),
+                )
+                for i, author_id in enumerate(authors)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        recipe_ids = list(
+            Recipe.objects
+            .filter(name__startswith=f'{PREFIX} recipe ')
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+        Recipe.tags.through.objects.bulk_create(
+            (
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.rng.sample(
+                    tag_ids, self.rng.randint(1, min(3, len(tag_ids)))
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        low = max(1, ingredients_per_recipe // 2)
+        high = min(len(ingredient_ids), ingredients_per_recipe * 3 // 2)
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.rng.sample(
+                    ingredient_ids, self.rng.randint(low, max(low, high))
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        return recipe_ids
+
+    def create_collections(self, user_ids: List[int], recipe_ids: List[int],
+                           favorites: int, cart: int) -> None:
+        UserFavorites.objects.bulk_create(
+            (UserFavorites(user_id=user_id) for user_id in user_ids),
+            batch_size=BATCH_SIZE,
+        )
+        UserShoppingCart.objects.bulk_create(
+            (UserShoppingCart(user_id=user_id) for user_id in user_ids),
+            batch_size=BATCH_SIZE,
+        )
+        FavoriteRecipe.objects.bulk_create(
+            (
+                FavoriteRecipe(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in self.rng.sample(
+                    recipe_ids, min(favorites, len(recipe_ids))
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
+        ShoppingCartRecipe.objects.bulk_create(
+            (
+                ShoppingCartRecipe(shopping_cart_id=user_id,
+                                   recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in self.rng.sample(
+                    recipe_ids, min(cart, len(recipe_ids))
+                )
+            ),
+            batch_size=BATCH_SIZE,
+        )
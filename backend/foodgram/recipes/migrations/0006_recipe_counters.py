@@ -0,0 +1,54 @@
+# Generated by Django 3.2.8 on 2026-10-18 19:08
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(model, field_name):
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(**{field_name: OuterRef('pk')})
+            .order_by()
+            .values(field_name)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FavoriteRecipe = apps.get_model('recipes', 'FavoriteRecipe')
+    ShoppingCartRecipe = apps.get_model('recipes', 'ShoppingCartRecipe')
+    User = apps.get_model('users', 'User')
+
+    Recipe.objects.update(
+        favorites_count=count_related(FavoriteRecipe, 'recipe'),
+        in_carts_count=count_related(ShoppingCartRecipe, 'recipe'),
+    )
+    User.objects.update(recipes_count=count_related(Recipe, 'author'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_recipes_count'),
+        ('recipes', '0005_recipe_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='Added to favorites'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Added to shopping carts'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
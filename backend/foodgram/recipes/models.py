@@ -1,13 +1,209 @@
-from collections import defaultdict, namedtuple
-from typing import List, Tuple
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
+from django.db import connection, connections, models
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef,
+                              Prefetch, Q, QuerySet, Subquery, Sum, Value,
+                              Window)
+from django.db.models.functions import Coalesce, Greatest, RowNumber
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from users.models import Follow
 
 User = get_user_model()
 
+SEARCH_CONFIG = 'russian'
+
+
+class DataVersionQuerySet(models.QuerySet):
+    def get_version(self, name) -> Tuple[int, Optional[datetime]]:
+        return self.filter(name=name).values_list(
+            'version', 'updated',
+        ).first() or (0, None)
+
+    def bump(self, name) -> None:
+        updated = self.filter(name=name).update(
+            version=F('version') + 1, updated=timezone.now(),
+        )
+        if not updated:
+            version, created = self.get_or_create(name=name)
+            if not created:
+                self.bump(name)
+
+
+class DataVersion(models.Model):
+    """
+    Version stamp of a table, bumped on every write to it. Lets readers
+    tell whether data they have cached is still current.
+    """
+    TAGS = 'tags'
+    INGREDIENTS = 'ingredients'
+    RECIPES = 'recipes'
+
+    name = models.CharField(
+        verbose_name=_('Name'),
+        max_length=64,
+        unique=True,
+    )
+    version = models.PositiveBigIntegerField(
+        verbose_name=_('Version'),
+        default=1,
+    )
+    updated = models.DateTimeField(
+        verbose_name=_('Updated'),
+        auto_now=True,
+    )
+
+    objects = DataVersionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _('Data version')
+        verbose_name_plural = _('Data versions')
+
+    def __str__(self):
+        return f'{self.name} v{self.version}'
+
+
+def count_related(model, field_name):
+    """Number of model rows whose field_name points to the outer row."""
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(**{field_name: OuterRef('pk')})
+            .order_by()
+            .values(field_name)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+class RecipeCollectionQuerySet(models.QuerySet):
+    """
+    Rows linking recipes to a per-user collection (favorites, shopping
+    cart). The model names its owner foreign key in owner_field and the
+    Recipe counter it feeds in counter_field.
+
+    add() and discard() each touch one row by the unique (owner, recipe)
+    key and report whether it changed, so repeated or concurrent toggles
+    neither scan the collection nor raise IntegrityError. add_many() and
+    discard_many() do the same for a list of recipes in one statement and
+    take the changed rows from its RETURNING clause (PostgreSQL, SQLite
+    3.35+), so concurrent requests never both count the same row.
+    """
+
+    def for_user(self, user_id: int):
+        return self.filter(**{f'{self.model.owner_field}_id': user_id})
+
+    def add(self, user_id: int, recipe_id: int) -> bool:
+        owner = self.ensure_owner(user_id)
+        return self._insert_ignore(self.model, {
+            owner.column: user_id,
+            self.model._meta.get_field('recipe').column: recipe_id,
+        }) == 1
+
+    def discard(self, user_id: int, recipe_id: int) -> bool:
+        deleted, _rows = self.for_user(user_id).filter(
+            recipe_id=recipe_id,
+        ).delete()
+        return deleted == 1
+
+    def add_many(self, user_id: int,
+                 recipe_ids: Iterable[int]) -> List[int]:
+        """Link existing recipes; return ids of those actually added."""
+        owner = self.ensure_owner(user_id)
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return []
+        ops = connections[self.db].ops
+        recipe_column = ops.quote_name(
+            self.model._meta.get_field('recipe').column
+        )
+        sql = '{} {} ({}, {}) VALUES {} {} RETURNING {}'.format(
+            ops.insert_statement(ignore_conflicts=True),
+            ops.quote_name(self.model._meta.db_table),
+            ops.quote_name(owner.column),
+            recipe_column,
+            ', '.join(['(%s, %s)'] * len(recipe_ids)),
+            ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+            recipe_column,
+        )
+        params = [value for pk in recipe_ids for value in (user_id, pk)]
+        return self._returning(sql, params)
+
+    def discard_many(self, user_id: int,
+                     recipe_ids: Iterable[int]) -> List[int]:
+        """Unlink recipes; return ids of those actually removed."""
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return []
+        ops = connections[self.db].ops
+        recipe_column = ops.quote_name(
+            self.model._meta.get_field('recipe').column
+        )
+        owner = self.model._meta.get_field(self.model.owner_field)
+        sql = (
+            'DELETE FROM {} WHERE {} = %s AND {} IN ({}) RETURNING {}'
+        ).format(
+            ops.quote_name(self.model._meta.db_table),
+            ops.quote_name(owner.column),
+            recipe_column,
+            ', '.join(['%s'] * len(recipe_ids)),
+            recipe_column,
+        )
+        return self._returning(sql, [user_id, *recipe_ids])
+
+    def recount(self, recipe_ids: Iterable[int]) -> int:
+        """Set the counter of recipes to the number of rows they have."""
+        return Recipe.objects.filter(pk__in=recipe_ids).update(**{
+            self.model.counter_field: count_related(self.model, 'recipe'),
+        })
+
+    def uncount_owner(self, user_id: int) -> int:
+        """
+        Decrement the counter of every recipe in the user's collection,
+        before the collection is deleted with all of its rows.
+        """
+        return Recipe.objects.filter(
+            pk__in=self.for_user(user_id).values('recipe'),
+        ).increment(self.model.counter_field, -1)
+
+    def ensure_owner(self, user_id: int):
+        """Create the user's collection row if missing; return its FK."""
+        owner = self.model._meta.get_field(self.model.owner_field)
+        wrapper = owner.related_model
+        self._insert_ignore(wrapper, {wrapper._meta.pk.column: user_id})
+        return owner
+
+    def _returning(self, sql: str, params: List[int]) -> List[int]:
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def _insert_ignore(self, model, values: Dict[str, int]) -> int:
+        """
+        INSERT a row, doing nothing if it violates a unique constraint,
+        and return the number of rows inserted.
+        """
+        database = connections[self.db]
+        ops = database.ops
+        sql = '{} {} ({}) VALUES ({}) {}'.format(
+            ops.insert_statement(ignore_conflicts=True),
+            ops.quote_name(model._meta.db_table),
+            ', '.join(ops.quote_name(column) for column in values),
+            ', '.join(['%s'] * len(values)),
+            ops.ignore_conflicts_suffix_sql(ignore_conflicts=True),
+        )
+        with database.cursor() as cursor:
+            cursor.execute(sql, list(values.values()))
+            return cursor.rowcount
+
 
 class UserFavorites(models.Model):
     user = models.OneToOneField(
@@ -29,6 +225,9 @@ class UserFavorites(models.Model):
 
 
 class FavoriteRecipe(models.Model):
+    owner_field = 'user'
+    counter_field = 'favorites_count'
+
     user = models.ForeignKey(
         UserFavorites,
         related_name='+',
@@ -42,6 +241,8 @@ class FavoriteRecipe(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = RecipeCollectionQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('User favorite recipe')
         verbose_name_plural = _('User favorite recipes')
@@ -76,32 +277,33 @@ class UserShoppingCart(models.Model):
     def __str__(self):
         return _('{} shopping cart').format(self.user)
 
-    def get_ingredients_to_buy(self) -> List[Tuple[str, int, str]]:
+    def get_ingredients_to_buy(self) -> 'QuerySet[Tuple[str, int, str]]':
         """
-        Return list of ingredients with their amount from shopping cart.
+        Return ingredients with their total amount from shopping cart.
+
+        Amounts are summed by the database and rows are ordered by
+        ingredient name, so the result can be streamed with iterator().
         """
-        ingredients = (
+        return (
             RecipeIngredient.objects
-            .filter(recipe__in=self.recipes.all())
-            .select_related('ingredient').all()
-        )
-        IngredientTuple = namedtuple(
-            'IngredientTuple', 'name measurement_unit',
+            .filter(
+                recipe__in=ShoppingCartRecipe.objects.filter(
+                    shopping_cart=self,
+                ).values('recipe'),
+            )
+            .values('ingredient__name', 'ingredient__measurement_unit')
+            .annotate(total=Sum('amount'))
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
+            .values_list(
+                'ingredient__name', 'total', 'ingredient__measurement_unit',
+            )
         )
-        counter = defaultdict(int)
-
-        for ingredient in ingredients:
-            counter[
-                IngredientTuple(
-                    ingredient.ingredient.name,
-                    ingredient.ingredient.measurement_unit
-                )
-            ] += ingredient.amount
-        return [(ingredient.name, amount, ingredient.measurement_unit)
-                for ingredient, amount in counter.items()]
 
 
 class ShoppingCartRecipe(models.Model):
+    owner_field = 'shopping_cart'
+    counter_field = 'in_carts_count'
+
     shopping_cart = models.ForeignKey(
         UserShoppingCart,
         related_name='+',
@@ -115,6 +317,8 @@ class ShoppingCartRecipe(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = RecipeCollectionQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Shopping cart recipe')
         verbose_name_plural = _('Shopping cart recipes')
@@ -132,6 +336,152 @@ class ShoppingCartRecipe(models.Model):
         )
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """
+        Annotate recipes with is_favorited and is_in_shopping_cart
+        flags for the given user.
+        """
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                FavoriteRecipe.objects.filter(
+                    user_id=user.id, recipe=OuterRef('pk'),
+                )
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCartRecipe.objects.filter(
+                    shopping_cart_id=user.id, recipe=OuterRef('pk'),
+                )
+            ),
+        )
+
+    def search(self, text):
+        """
+        Filter recipes by full-text search over name and text and
+        annotate them with search_rank.
+
+        On Postgres the query is matched against the GIN-indexed
+        search_vector, which is maintained by a database trigger. Other
+        databases fall back to case-insensitive substring matching.
+        """
+        if connection.vendor != 'postgresql':
+            return self.filter(
+                Q(name__icontains=text) | Q(text__icontains=text)
+            ).annotate(search_rank=Value(1.0))
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch',
+        )
+        return self.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+        )
+
+    def increment(self, field, delta=1):
+        """Atomically change a counter column, never going below zero."""
+        return self.update(**{field: Greatest(F(field) + delta, 0)})
+
+    def attach_to_authors(self, authors, limit=None):
+        """
+        Set limited_recipes on every author to their first limit recipes,
+        fetched for all authors with one windowed query.
+        """
+        authors = list(authors)
+        queryset = self.filter(
+            author__in=authors,
+        ).only(
+            'id', 'author_id', 'name', 'image', 'image_variants',
+            'cooking_time',
+        )
+        if limit is not None:
+            ranked = queryset.annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=F('id').asc(),
+                ),
+            )
+            sql, params = ranked.query.sql_with_params()
+            queryset = self.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE ranked.position <= %s '
+                f'ORDER BY ranked.author_id, ranked.position',
+                (*params, limit),
+            )
+        recipes = defaultdict(list)
+        for recipe in queryset:
+            recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.limited_recipes = recipes[author.id]
+        return authors
+
+    def get_state(self, pk, user):
+        """
+        Return the values a recipe representation for the given user
+        depends on, without fetching the recipe itself, or None if there
+        is no such recipe. Used to validate cached detail responses.
+
+        Tags and ingredients are covered by their data versions, author
+        details by their values.
+        """
+        if user.is_anonymous:
+            is_subscribed = Value(False, output_field=BooleanField())
+        else:
+            is_subscribed = Exists(
+                Follow.objects.filter(
+                    from_user_id=user.id, to_user=OuterRef('author_id'),
+                )
+            )
+        versions = {
+            f'{name}_version': Subquery(
+                DataVersion.objects.filter(name=name).values('version')[:1]
+            )
+            for name in (DataVersion.TAGS, DataVersion.INGREDIENTS)
+        }
+        return (
+            self.filter(pk=pk)
+            .with_user_flags(user)
+            .annotate(is_subscribed=is_subscribed, **versions)
+            .values_list(
+                'updated', 'favorites_count', 'in_carts_count',
+                'is_favorited', 'is_in_shopping_cart', 'is_subscribed',
+                'author__email', 'author__username', 'author__first_name',
+                'author__last_name', 'tags_version', 'ingredients_version',
+            )
+            .first()
+        )
+
+    def with_related(self, user):
+        """
+        Prefetch everything the recipe serializer renders: the author
+        with is_subscribed annotated for the given user, tags and
+        ingredients together with their Ingredient rows.
+        """
+        if user.is_anonymous:
+            is_subscribed = Value(False, output_field=BooleanField())
+        else:
+            is_subscribed = Exists(
+                Follow.objects.filter(
+                    from_user_id=user.id, to_user=OuterRef('pk'),
+                )
+            )
+        return self.prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(is_subscribed=is_subscribed),
+            ),
+            'tags',
+            Prefetch(
+                'ingredients',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('recipe_id', 'ingredient_id'),
+            ),
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -152,6 +502,12 @@ class Recipe(models.Model):
         upload_to='recipes/images/',
         help_text=_('Enter recipe image'),
     )
+    image_variants = models.JSONField(
+        verbose_name=_('Image variants'),
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name=_('Text'),
         help_text=_('Give recipe description'),
@@ -170,11 +526,39 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True,
     )
+    updated = models.DateTimeField(
+        verbose_name=_('Updated'),
+        auto_now=True,
+    )
+    search_vector = SearchVectorField(
+        verbose_name=_('Search vector'),
+        null=True,
+        editable=False,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name=_('Added to favorites'),
+        default=0,
+        editable=False,
+        db_index=True,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name=_('Added to shopping carts'),
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = _('Recipe')
         verbose_name_plural = _('Recipes')
         ordering = ('id',)
+        indexes = (
+            models.Index(
+                name='recipe_created_id_idx',
+                fields=('-created', '-id'),
+            ),
+        )
 
     def __str__(self):
         return f'{self.name}'
@@ -0,0 +1,15 @@
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Use the first parser and renderer of the view whatever the Accept
+    header and format query param say. File exports choose their format
+    themselves and only render errors through DRF.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
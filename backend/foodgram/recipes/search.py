@@ -0,0 +1,206 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .models import Ingredient
+
+IndexKey = Tuple[str, int]
+
+WORD_SEPARATOR = re.compile(r'[\W_]+')
+
+
+def make_trigrams(text: str) -> FrozenSet[str]:
+    """
+    Split text into trigrams the way pg_trgm does: every word is
+    lowercased and padded with two spaces in front and one behind.
+    """
+    trigrams = set()
+    for word in WORD_SEPARATOR.split(text.casefold()):
+        if not word:
+            continue
+        padded = f'  {word} '
+        trigrams.update(
+            padded[i:i + 3] for i in range(len(padded) - 2)
+        )
+    return frozenset(trigrams)
+
+
+class IngredientIndex:
+    """
+    In-process ingredient index answering name prefix queries.
+
+    Keeps (casefolded name, id) pairs in a sorted list, so a prefix query
+    is a binary search followed by a scan of matching names. Typo-tolerant
+    queries use an inverted index from name trigrams to ingredient ids.
+    Rows are loaded from the database on first use and then kept up to
+    date by add() and remove().
+    """
+
+    def __init__(self):
+        self._keys: List[IndexKey] = []
+        self._items: Dict[int, dict] = {}
+        self._trigrams: Dict[int, FrozenSet[str]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        self._is_built = False
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def make_key(ingredient: dict) -> IndexKey:
+        return ingredient['name'].casefold(), ingredient['id']
+
+    def build(self, ingredients=None) -> None:
+        if ingredients is None:
+            ingredients = Ingredient.objects.values(
+                'id', 'name', 'measurement_unit',
+            ).order_by()
+        items = {ingredient['id']: ingredient for ingredient in ingredients}
+        keys = sorted(self.make_key(item) for item in items.values())
+        trigrams = {
+            ingredient_id: make_trigrams(item['name'])
+            for ingredient_id, item in items.items()
+        }
+        postings = {}
+        for ingredient_id, item_trigrams in trigrams.items():
+            for trigram in item_trigrams:
+                postings.setdefault(trigram, set()).add(ingredient_id)
+        with self._lock:
+            self._items = items
+            self._keys = keys
+            self._trigrams = trigrams
+            self._postings = postings
+            self._is_built = True
+
+    def ensure_built(self) -> None:
+        if not self._is_built:
+            with self._lock:
+                if not self._is_built:
+                    self.build()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._is_built = False
+
+    def add(self, ingredient: Ingredient) -> None:
+        item = {
+            'id': ingredient.id,
+            'name': ingredient.name,
+            'measurement_unit': ingredient.measurement_unit,
+        }
+        with self._lock:
+            if not self._is_built:
+                return
+            self._discard(ingredient.id)
+            self._items[ingredient.id] = item
+            insort(self._keys, self.make_key(item))
+            self._trigrams[ingredient.id] = make_trigrams(item['name'])
+            for trigram in self._trigrams[ingredient.id]:
+                self._postings.setdefault(trigram, set()).add(ingredient.id)
+
+    def remove(self, ingredient_id: int) -> None:
+        with self._lock:
+            if self._is_built:
+                self._discard(ingredient_id)
+
+    def _discard(self, ingredient_id: int) -> None:
+        item = self._items.pop(ingredient_id, None)
+        if item is not None:
+            key = self.make_key(item)
+            del self._keys[bisect_left(self._keys, key)]
+            for trigram in self._trigrams.pop(ingredient_id):
+                self._postings[trigram].discard(ingredient_id)
+
+    def search(self, prefix: str, limit: Optional[int] = None) -> List[dict]:
+        """Return ingredients whose name starts with prefix, by name."""
+        self.ensure_built()
+        with self._lock:
+            return self._search_prefix(prefix.casefold(), limit)
+
+    def _search_prefix(self, prefix, limit):
+        result = []
+        position = bisect_left(self._keys, (prefix,))
+        while position < len(self._keys):
+            if limit is not None and len(result) >= limit:
+                break
+            name, ingredient_id = self._keys[position]
+            if not name.startswith(prefix):
+                break
+            result.append(self._items[ingredient_id])
+            position += 1
+        return result
+
+    def search_similar(self, query: str, limit: Optional[int] = None,
+                       threshold: float = 0.3) -> List[dict]:
+        """
+        Return ingredients ranked by trigram similarity to query.
+
+        Prefix matches go first, the rest are ingredients whose
+        similarity is at least threshold, the most similar first.
+        """
+        self.ensure_built()
+        query_trigrams = make_trigrams(query)
+        with self._lock:
+            result = self._search_prefix(query.casefold(), limit)
+            found = {item['id'] for item in result}
+            shared = {}
+            for trigram in query_trigrams:
+                for ingredient_id in self._postings.get(trigram, ()):
+                    shared[ingredient_id] = shared.get(ingredient_id, 0) + 1
+            ranked = []
+            for ingredient_id, count in shared.items():
+                if ingredient_id in found:
+                    continue
+                similarity = count / (
+                    len(query_trigrams)
+                    + len(self._trigrams[ingredient_id])
+                    - count
+                )
+                if similarity >= threshold:
+                    ranked.append((
+                        -similarity,
+                        self._items[ingredient_id]['name'],
+                        ingredient_id,
+                    ))
+            if limit is None:
+                ranked.sort()
+            else:
+                ranked = heapq.nsmallest(limit - len(result), ranked)
+            result.extend(self._items[item[-1]] for item in ranked)
+        return result
+
+
+def search_similar_in_database(query: str, limit: Optional[int] = None,
+                               threshold: float = 0.3) -> List[dict]:
+    """
+    Rank ingredients by trigram similarity with pg_trgm. Both the %
+    operator behind trigram_similar and the ~* prefix match are served
+    by the GIN trigram index on name.
+    """
+    queryset = (
+        Ingredient.objects
+        .annotate(
+            is_prefix=Case(
+                When(name__istartswith=query, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ),
+            similarity=TrigramSimilarity('name', query),
+        )
+        .filter(
+            Q(name__trigram_similar=query)
+            | Q(name__iregex=f'^{re.escape(query)}')
+        )
+        .filter(Q(is_prefix=1) | Q(similarity__gte=threshold))
+        .order_by('-is_prefix', '-similarity', 'name')
+        .values('id', 'name', 'measurement_unit')
+    )
+    if limit is not None:
+        queryset = queryset[:limit]
+    return list(queryset)
+
+
+ingredient_index = IngredientIndex()
@@ -1,9 +1,82 @@
+from collections.abc import Mapping
+
+from django.conf import settings as django_settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from djoser.conf import settings
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import exceptions, serializers
-
-from .models import (Ingredient, Recipe, RecipeIngredient, Tag, UserFavorites,
-                     UserShoppingCart)
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from .catalog import catalog
+from .fields import ImageVariantsField, RecipeImageField
+from .models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCartRecipe, Tag)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field able to look up a batch of values with one query.
+
+    resolve() fetches all given primary keys at once, from the catalog
+    cache when one is given; until the batch is released,
+    to_internal_value() reads objects from it instead of making a query
+    per value. Errors are the same as in PrimaryKeyRelatedField.
+    """
+
+    def __init__(self, catalog=None, **kwargs):
+        self.catalog = catalog
+        self.resolved = None
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        return self.get_queryset().model._meta.pk.to_python(data)
+
+    def resolve(self, values):
+        pks = set()
+        for value in values:
+            try:
+                pks.add(self.to_pk(value))
+            except (DjangoValidationError, serializers.ValidationError):
+                continue
+        if self.catalog is not None:
+            self.resolved = self.catalog.get_many(pks)
+        else:
+            self.resolved = self.get_queryset().in_bulk(pks)
+
+    def release(self):
+        self.resolved = None
+
+    def to_internal_value(self, data):
+        if self.resolved is None:
+            return super().to_internal_value(data)
+        try:
+            pk = self.to_pk(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if pk not in self.resolved:
+            self.fail('does_not_exist', pk_value=data)
+        return self.resolved[pk]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    def to_internal_value(self, data):
+        if not isinstance(data, (list, tuple)):
+            return super().to_internal_value(data)
+        self.child_relation.resolve(data)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.child_relation.release()
 
 
 class TagExplicitSerializer(serializers.ModelSerializer):
@@ -12,9 +85,16 @@ class TagExplicitSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class TagSerializer(serializers.PrimaryKeyRelatedField):
+class TagSerializer(BulkPrimaryKeyRelatedField):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('catalog', catalog.tags)
+        super().__init__(**kwargs)
+
     def to_representation(self, instance):
-        return TagExplicitSerializer(instance).data
+        data = catalog.tags.get_data(instance.pk)
+        if data is None:
+            return TagExplicitSerializer(instance).data
+        return data
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -42,9 +122,27 @@ class RecipeIngredientExplicitSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """Look up ingredients of all submitted items with one query."""
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            return super().to_internal_value(data)
+        id_field = self.child.fields['id']
+        id_field.resolve(
+            item['id'] for item in data
+            if isinstance(item, Mapping) and 'id' in item
+        )
+        try:
+            return super().to_internal_value(data)
+        finally:
+            id_field.release()
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
+        catalog=catalog.ingredients,
     )
     amount = serializers.IntegerField(
         min_value=1,
@@ -53,6 +151,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = RecipeIngredientListSerializer
 
     def to_representation(self, instance):
         return RecipeIngredientExplicitSerializer(instance).data
@@ -64,41 +163,57 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        exclude = ('created',)
+        exclude = ('created', 'updated', 'search_vector')
 
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
-        favorites, _ = UserFavorites.objects.prefetch_related(
-            'recipes'
-        ).get_or_create(user=user)
-        return recipe in favorites.recipes.all()
+        return FavoriteRecipe.objects.filter(
+            user_id=user.id, recipe=recipe,
+        ).exists()
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
-        shopping_cart, _ = UserShoppingCart.objects.prefetch_related(
-            'recipes'
-        ).get_or_create(user=user)
-        return recipe in shopping_cart.recipes.all()
+        return ShoppingCartRecipe.objects.filter(
+            shopping_cart_id=user.id, recipe=recipe,
+        ).exists()
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Delete the temporary file of a decoded base64 image right
+            # away; multipart uploads are closed with the request.
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
 
     def create(self, validated_data):
         ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
 
-        recipe = Recipe.objects.create(**validated_data)
-
-        recipe.tags.set(tags)
-        for ingredient_data in ingredients_data:
-            recipe.ingredients.create(
-                ingredient=ingredient_data['id'],
-                amount=ingredient_data['amount'],
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient_data['id'],
+                    amount=ingredient_data['amount'],
+                )
+                for ingredient_data in ingredients_data
             )
         return recipe
 
@@ -109,17 +224,46 @@ class RecipeSerializer(serializers.ModelSerializer):
         for field, value in validated_data.items():
             recipe.__setattr__(field, value)
 
-        recipe.tags.clear()
-        recipe.tags.set(tags)
+        with transaction.atomic():
+            recipe.tags.set(tags)
+            self.update_ingredients(recipe, ingredients_data)
+            # Counters and image variants change concurrently through F()
+            # updates and jobs; saving the stale values would undo them.
+            recipe.save(update_fields=[*validated_data, 'updated'])
+        return recipe
 
-        recipe.ingredients.all().delete()
+    @staticmethod
+    def update_ingredients(recipe, ingredients_data):
+        """
+        Bring recipe ingredients in line with ingredients_data touching
+        only rows that were added, removed or got a different amount.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.ingredients.all()
+        }
+        to_create = []
+        to_update = []
         for ingredient_data in ingredients_data:
-            recipe.ingredients.create(
-                ingredient=ingredient_data['id'],
-                amount=ingredient_data['amount'],
-            )
-        recipe.save()
-        return recipe
+            ingredient = ingredient_data['id']
+            amount = ingredient_data['amount']
+            recipe_ingredient = current.pop(ingredient.id, None)
+            if recipe_ingredient is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=amount,
+                ))
+            elif recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+
+        if current:
+            RecipeIngredient.objects.filter(
+                pk__in=[item.pk for item in current.values()],
+            ).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
 
     @staticmethod
     def validate_ingredients(ingredients):
@@ -143,11 +287,41 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 
 class RecipeShortSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
+
+
+class RecipeIdListSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+    )
+
+    @staticmethod
+    def validate_recipes(recipes):
+        recipes = list(dict.fromkeys(recipes))
+        max_size = django_settings.RECIPE_BULK_MAX_SIZE
+        if len(recipes) > max_size:
+            raise serializers.ValidationError(
+                f'Ensure this field has no more than {max_size} elements.'
+            )
+        return recipes
+
+
+def get_recipes_limit(request):
+    limit = request.query_params.get('recipes_limit')
+    if limit is None:
+        return None
+    try:
+        return int(limit)
+    except ValueError:
+        raise exceptions.ParseError(
+            'recipes_limit query param must be an integer.'
+        )
 
 
 class UserSerializer(settings.SERIALIZERS.user):
@@ -160,16 +334,12 @@ class UserSerializer(settings.SERIALIZERS.user):
         )
 
     def get_recipes(self, user):
-        queryset = user.recipes.all()
-        limit = self.context['request'].query_params.get('recipes_limit')
-        if limit is not None:
-            try:
-                limit = int(limit)
-            except ValueError:
-                raise exceptions.ParseError(
-                    'recipes_limit query param must be an integer.'
-                )
-            else:
+        if hasattr(user, 'limited_recipes'):
+            queryset = user.limited_recipes
+        else:
+            queryset = user.recipes.all()
+            limit = get_recipes_limit(self.context['request'])
+            if limit is not None:
                 queryset = queryset[:limit]
         return RecipeShortSerializer(
             queryset,
@@ -179,4 +349,4 @@ class UserSerializer(settings.SERIALIZERS.user):
 
     @staticmethod
     def get_recipes_count(user):
-        return user.recipes.count()
+        return user.recipes_count
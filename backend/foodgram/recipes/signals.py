@@ -0,0 +1,94 @@
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from .catalog import catalog
+from .images import iter_variant_files
+from .models import (DataVersion, Ingredient, Recipe, RecipeIngredient, Tag,
+                     UserFavorites, UserShoppingCart)
+from .search import ingredient_index
+from .tasks import delete_media_files, generate_image_variants
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient(sender, instance, **kwargs):
+    ingredient_index.add(instance)
+
+
+@receiver(post_delete, sender=Ingredient)
+def unindex_ingredient(sender, instance, **kwargs):
+    ingredient_index.remove(instance.id)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    DataVersion.objects.bump(DataVersion.INGREDIENTS)
+    DataVersion.objects.bump(DataVersion.RECIPES)
+    catalog.ingredients.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    DataVersion.objects.bump(DataVersion.TAGS)
+    DataVersion.objects.bump(DataVersion.RECIPES)
+    catalog.tags.invalidate()
+
+
+# RecipeIngredient rows are deleted either with their recipe or by the
+# serializer, which saves the recipe as well. A post_delete receiver for
+# them would turn cascade deletes into a signal per row.
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+def bump_recipes_version(sender, **kwargs):
+    DataVersion.objects.bump(DataVersion.RECIPES)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipes_version_on_tags(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        DataVersion.objects.bump(DataVersion.RECIPES)
+
+
+@receiver(post_save, sender=Recipe)
+def count_created_recipe(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def count_deleted_recipe(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id).update(
+        recipes_count=Greatest(F('recipes_count') - 1, 0)
+    )
+
+
+# Collections go away when their user is deleted; their rows are then
+# fast-deleted by the cascade, so counters are adjusted here while the
+# rows still exist.
+@receiver(pre_delete, sender=UserFavorites)
+@receiver(pre_delete, sender=UserShoppingCart)
+def uncount_deleted_collection(sender, instance, **kwargs):
+    sender.recipes.through.objects.uncount_owner(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def update_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    variants = instance.image_variants or {}
+    if variants.get('source') != instance.image.name:
+        generate_image_variants.enqueue(recipe_id=instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_image_variants(sender, instance, **kwargs):
+    names = list(iter_variant_files(instance.image_variants or {}))
+    if names:
+        delete_media_files.enqueue(names=names)
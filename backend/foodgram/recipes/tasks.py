@@ -0,0 +1,45 @@
+from django.utils import timezone
+from jobs.queue import task
+
+from .images import (delete_files, delete_stale_variants, generate_variants,
+                     iter_variant_files)
+from .models import DataVersion, Recipe
+
+
+@task(name='recipes.generate_image_variants')
+def generate_image_variants(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'id', 'image', 'image_variants',
+    ).first()
+    if recipe is None or not recipe.image:
+        return
+    old_variants = recipe.image_variants or {}
+    if old_variants.get('source') == recipe.image.name:
+        return
+    save_image_variants(
+        recipe_id, recipe.image.name, old_variants,
+        generate_variants(recipe.image.name),
+    )
+
+
+def save_image_variants(recipe_id: int, image_name: str, old_variants: dict,
+                        variants: dict) -> bool:
+    """
+    Store variants rendered from image_name unless the recipe got another
+    image meanwhile, and delete the files of whichever set lost.
+    """
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=image_name,
+    ).update(image_variants=variants, updated=timezone.now())
+    if updated:
+        DataVersion.objects.bump(DataVersion.RECIPES)
+        delete_stale_variants(old_variants, variants)
+    else:
+        # The image was replaced while variants were being rendered.
+        delete_files(iter_variant_files(variants))
+    return bool(updated)
+
+
+@task(name='recipes.delete_files')
+def delete_media_files(names):
+    delete_files(names)
@@ -177,6 +177,16 @@ FAVORITE_URL = reverse(
     'recipes:recipe-favorite',
     kwargs={'pk': 1},
 )
+FAVORITE_MANY_URL = reverse(
+    'recipes:recipe-favorite-many',
+)
+SHOPPING_CART_MANY_URL = reverse(
+    'recipes:recipe-shopping-cart-many',
+)
+
+SUBSCRIPTIONS_URL = reverse(
+    'users:user-subscriptions',
+)
 
 TAG_SERIALIZER_FIELDS = (
     'id',
@@ -210,3 +220,9 @@ INGREDIENT_SERIALIZER = (
     'name',
     'measurement_unit',
 )
+
+TEST_IMAGE = (
+    'data:image/png;base64,'
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADElEQVR4nGNgYGAAAAAEAAH2'
+    'FzhVAAAAAElFTkSuQmCC'
+)
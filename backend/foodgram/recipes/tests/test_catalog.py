@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..catalog import catalog
+from ..models import DataVersion, Ingredient, Recipe, Tag
+from ..search import ingredient_index
+from . import constants as _
+
+User = get_user_model()
+
+
+class TestCatalog(TestCase):
+    def setUp(self) -> None:
+        self.tag = Tag.objects.create(**_.TEST_TAG)
+        self.ingredient = Ingredient.objects.create(**_.TEST_INGREDIENT)
+        catalog.preload()
+
+    def test_lookups_do_not_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                catalog.tags.get_many([self.tag.id, 0]),
+                {self.tag.id: self.tag},
+            )
+            self.assertEqual(
+                catalog.ingredients.get_data(self.ingredient.id)['name'],
+                self.ingredient.name,
+            )
+            self.assertEqual(len(catalog.tags.all_data()), 1)
+
+    def test_local_write_invalidates(self):
+        Tag.objects.filter(pk=self.tag.pk).update(name='stale')
+        self.assertEqual(catalog.tags.get_data(self.tag.id)['name'], 'test')
+
+        self.tag.name = 'renamed'
+        self.tag.save()
+        self.assertEqual(
+            catalog.tags.get_data(self.tag.id)['name'], 'renamed',
+        )
+
+    def test_version_check(self):
+        Ingredient.objects.bulk_create([
+            Ingredient(name='tester', measurement_unit='г'),
+        ])
+        # Simulate a write made by another worker.
+        DataVersion.objects.bump(DataVersion.INGREDIENTS)
+
+        with override_settings(CATALOG_CACHE={'CHECK_INTERVAL': 0}):
+            with self.assertNumQueries(3):
+                data = catalog.ingredients.all_data()
+            with self.assertNumQueries(1):
+                catalog.ingredients.all_data()
+        self.assertEqual(len(data), 2)
+        self.assertEqual(len(ingredient_index.search('tes')), 2)
+
+    def test_recipe_filter_by_tags(self):
+        author = User.objects.create(**_.TEST_USER)
+        recipe = Recipe.objects.create(author=author, **_.TEST_RECIPE)
+        recipe.tags.add(self.tag)
+        Recipe.objects.create(author=author, **_.TEST_RECIPE_2)
+
+        client = APIClient()
+        response = client.get(_.RECIPE_LIST_URL, {'tags': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+        response = client.get(_.RECIPE_LIST_URL, {'tags': self.tag.slug})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], [recipe.id],
+        )
@@ -0,0 +1,283 @@
+import base64
+import json
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..management.commands.loadingredients import (MAX_ITEM_SIZE,
+                                                    iter_json_array)
+from ..models import (FavoriteRecipe, Ingredient, Recipe, RecipeIngredient,
+                      Tag)
+from . import constants as _
+
+User = get_user_model()
+
+DATA = [
+    {'name': 'соль', 'measurement_unit': 'г'},
+    {'name': 'сахар', 'measurement_unit': 'г'},
+    {'name': 'молоко', 'measurement_unit': 'мл'},
+]
+
+
+class TestJSONArrayParser(SimpleTestCase):
+    def test_small_chunks(self):
+        text = ' [\n' + ',\n'.join(json.dumps(item) for item in DATA) + ']'
+        for chunk_size in (1, 7, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                items = iter_json_array(StringIO(text), chunk_size)
+                self.assertEqual(list(items), DATA)
+
+    def test_invalid(self):
+        for text in ('', '{}', '[{"name": "соль"}', '[{"name": }]'):
+            with self.subTest(text=text):
+                with self.assertRaises(CommandError):
+                    list(iter_json_array(StringIO(text), 4))
+
+    def test_malformed_item_is_not_read_to_the_end(self):
+        item = json.dumps(DATA[0])
+        text = '[{"name": }, ' + ', '.join([item] * MAX_ITEM_SIZE) + ']'
+        fp = StringIO(text)
+        with self.assertRaises(CommandError):
+            list(iter_json_array(fp, 1024))
+        self.assertLess(fp.tell(), 2 * MAX_ITEM_SIZE)
+
+
+class TestLoadIngredients(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as fp:
+            fp.write(content)
+        return path
+
+    def load(self, path, **options):
+        out = StringIO()
+        call_command(
+            'loadingredients', path, stdout=out, stderr=StringIO(), **options
+        )
+        return out.getvalue()
+
+    def ingredients(self):
+        return set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+
+    def test_formats(self):
+        expected = {(item['name'], item['measurement_unit']) for item in DATA}
+        lines = [json.dumps(item) for item in DATA]
+        files = {
+            'ingredients.json': json.dumps(DATA),
+            'ingredients.ndjson': '\n'.join(lines + [lines[0], '']),
+            'ingredients.csv': 'name,measurement_unit\n' + ''.join(
+                f'{item["name"]},{item["measurement_unit"]}\n'
+                for item in DATA
+            ),
+        }
+        for name, content in files.items():
+            with self.subTest(file=name):
+                Ingredient.objects.all().delete()
+                self.load(self.write(name, content), batch_size=2)
+                self.assertEqual(self.ingredients(), expected)
+
+    def test_rerun_is_idempotent(self):
+        Ingredient.objects.create(**DATA[0])
+        path = self.write('ingredients.json', json.dumps(DATA))
+        self.assertIn('Created 2 ingredients', self.load(path))
+        self.assertIn('Created 0 ingredients', self.load(path))
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    def test_duplicates_and_invalid(self):
+        data = DATA + [DATA[0], {'name': ''}, ['соль'], 'мука']
+        path = self.write('ingredients.json', json.dumps(data))
+        output = self.load(path)
+        self.assertIn('Processed 7 records', output)
+        self.assertIn(
+            'Created 3 ingredients, skipped 1 duplicates and 3 invalid',
+            output,
+        )
+
+    def test_duplicates_across_batches(self):
+        Ingredient.objects.create(**DATA[0])
+        path = self.write('ingredients.json', json.dumps(DATA + DATA))
+        output = self.load(path, batch_size=2)
+        self.assertIn('Created 2 ingredients, skipped 4 duplicates', output)
+        self.assertEqual(Ingredient.objects.count(), 3)
+
+    def test_dry_run(self):
+        Ingredient.objects.create(**DATA[0])
+        path = self.write('ingredients.txt', json.dumps(DATA))
+        output = self.load(path, format='json', dry_run=True, batch_size=1)
+        self.assertIn('Would create 2 ingredients', output)
+        self.assertEqual(Ingredient.objects.count(), 1)
+
+    def test_errors(self):
+        with self.assertRaises(CommandError):
+            self.load(os.path.join(self.directory, 'missing.json'))
+        with self.assertRaises(CommandError):
+            self.load(self.write('ingredients.txt', '[]'))
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TestRecipeTransfer(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.author = User.objects.create(**_.TEST_USER)
+        self.tag = Tag.objects.create(**_.TEST_TAG)
+        self.ingredient = Ingredient.objects.create(**_.TEST_INGREDIENT)
+        image = default_storage.save(
+            'recipes/images/photo.png',
+            ContentFile(base64.b64decode(_.TEST_IMAGE.split(',')[1])),
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, image=image, **_.TEST_RECIPE
+        )
+        self.recipe.tags.add(self.tag)
+        RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.ingredient, amount=3,
+        )
+        self.path = os.path.join(self.directory, 'recipes.ndjson')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def import_recipes(self, **options):
+        out = StringIO()
+        call_command(
+            'importrecipes', self.path, workers=1, stdout=out,
+            stderr=StringIO(), **options
+        )
+        return out.getvalue()
+
+    def test_export(self):
+        out = StringIO()
+        call_command('exportrecipes', stdout=out)
+        self.assertEqual(json.loads(out.getvalue()), {
+            'name': self.recipe.name,
+            'author': self.author.email,
+            'text': self.recipe.text,
+            'cooking_time': self.recipe.cooking_time,
+            'image': self.recipe.image.name,
+            'tags': [self.tag.slug],
+            'ingredients': [{
+                'name': self.ingredient.name,
+                'measurement_unit': self.ingredient.measurement_unit,
+                'amount': 3,
+            }],
+        })
+
+    def test_round_trip(self):
+        call_command('exportrecipes', self.path, stdout=StringIO())
+        with open(self.path, 'r+', encoding='utf-8') as fp:
+            record = json.loads(fp.readline())
+            fp.write('[]\n')
+            fp.write(json.dumps({**record, 'name': 'other', 'tags': ['x']}))
+        self.recipe.delete()
+
+        output = self.import_recipes(media_dir=MEDIA_ROOT, batch_size=1)
+        self.assertIn('Imported 1 recipes', output)
+        self.assertIn('skipped 0 existing and 2 invalid of 3 records', output)
+        recipe = Recipe.objects.get()
+        self.assertEqual(list(recipe.tags.all()), [self.tag])
+        self.assertEqual(
+            list(recipe.ingredients.values_list('ingredient', 'amount')),
+            [(self.ingredient.id, 3)],
+        )
+        self.assertNotEqual(recipe.image.name, self.recipe.image.name)
+        self.assertEqual(recipe.image_variants['source'], recipe.image.name)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+
+        output = self.import_recipes()
+        self.assertIn('skipped 1 existing', output)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_missing_author_and_image(self):
+        call_command('exportrecipes', self.path, stdout=StringIO())
+        self.recipe.delete()
+        User.objects.filter(pk=self.author.pk).update(email='other@test.com')
+        output = self.import_recipes()
+        self.assertIn('1 invalid', output)
+
+        other = User.objects.create(**_.TEST_USER_2)
+        default_storage.delete(self.recipe.image.name)
+        output = self.import_recipes(author=other.email)
+        self.assertIn('1 invalid', output)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_decompression_bomb(self):
+        # A tiny PNG claiming to be 20000x20000 pixels, which PIL refuses
+        # to open with DecompressionBombError.
+        def chunk(kind, data):
+            return b''.join((
+                struct.pack('>I', len(data)), kind, data,
+                struct.pack('>I', zlib.crc32(kind + data)),
+            ))
+
+        header = struct.pack('>IIBBBBB', 20000, 20000, 1, 0, 0, 0, 0)
+        default_storage.save('bomb.png', ContentFile(b''.join((
+            b'\x89PNG\r\n\x1a\n', chunk(b'IHDR', header),
+            chunk(b'IDAT', b''), chunk(b'IEND', b''),
+        ))))
+        call_command('exportrecipes', self.path, stdout=StringIO())
+        with open(self.path, 'r+', encoding='utf-8') as fp:
+            record = json.loads(fp.readline())
+            fp.write(json.dumps({
+                **record, 'name': 'bomb', 'image': 'bomb.png',
+            }))
+        self.recipe.delete()
+
+        output = self.import_recipes(media_dir=MEDIA_ROOT)
+        self.assertIn('Imported 1 recipes', output)
+        self.assertIn('1 invalid of 2 records', output)
+        self.assertEqual(Recipe.objects.get().name, self.recipe.name)
+
+
+class TestSeedBench(TestCase):
+    def seed(self, **options):
+        call_command(
+            'seedbench', users=10, recipes=30, follows=3, favorites=4,
+            cart=2, stdout=StringIO(), **options
+        )
+        return list(
+            Recipe.objects.order_by('pk').values_list(
+                'name', 'author__username', 'cooking_time', 'favorites_count',
+            )
+        )
+
+    def test_seed(self):
+        first = self.seed()
+        self.assertEqual(len(first), 30)
+        self.assertEqual(FavoriteRecipe.objects.count(), 40)
+        self.assertEqual(
+            sum(count for *_fields, count in first), 40,
+        )
+        author = User.objects.get(username=first[0][1])
+        self.assertEqual(author.recipes_count, author.recipes.count())
+        self.assertTrue(Ingredient.objects.exists())
+
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.assertEqual(self.seed(clear=True), first)
@@ -0,0 +1,161 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from foodgram.cache import FileSystemStore, MemoryLRUStore
+from rest_framework.test import APIClient
+
+from .. import exports
+from ..models import (Ingredient, Recipe, RecipeIngredient,
+                      UserShoppingCart)
+from . import constants as _
+
+User = get_user_model()
+
+INGREDIENTS = [('мука', 100, 'г'), ('соль', 3, 'г')]
+
+
+class TestStores(TestCase):
+    def get_stores(self, **options):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        return {
+            'memory': MemoryLRUStore(**options),
+            'filesystem': FileSystemStore(location, **options),
+        }
+
+    def test_hits_and_misses(self):
+        for name, store in self.get_stores().items():
+            with self.subTest(store=name):
+                self.assertIsNone(store.get('key'))
+                store.set('key', b'value')
+                self.assertEqual(store.get('key'), b'value')
+                self.assertEqual(store.stats, {'hits': 1, 'misses': 1})
+
+    def test_size_eviction(self):
+        for name, store in self.get_stores(max_size=10).items():
+            with self.subTest(store=name):
+                store.set('first', b'12345')
+                store.set('second', b'12345')
+                store.set('third', b'12345')
+                self.assertIsNone(store.get('first'))
+                self.assertEqual(store.get('third'), b'12345')
+
+                store.set('too large', b'12345678901')
+                self.assertIsNone(store.get('too large'))
+
+    def test_filesystem_scans_only_when_needed(self):
+        store = self.get_stores(max_size=10)['filesystem']
+        with mock.patch.object(
+            store, '_entries', wraps=store._entries,
+        ) as entries:
+            store.set('first', b'123')
+            store.set('second', b'123')
+            self.assertEqual(entries.call_count, 1)
+            store.set('third', b'12345')
+            self.assertEqual(entries.call_count, 2)
+            with mock.patch(
+                'foodgram.cache.time.monotonic', return_value=10 ** 12
+            ):
+                store.set('fourth', b'1')
+            self.assertEqual(entries.call_count, 3)
+        self.assertIsNone(store.get('first'))
+        self.assertEqual(store.get('third'), b'12345')
+
+    def test_age_eviction(self):
+        for name, store in self.get_stores(max_age=60).items():
+            with self.subTest(store=name):
+                store.set('key', b'value')
+                with mock.patch(
+                    'foodgram.cache.time.time', return_value=10 ** 12
+                ):
+                    self.assertIsNone(store.get('key'))
+
+
+class TestShoppingListPDFCache(TestCase):
+    def setUp(self) -> None:
+        exports.get_pdf_cache().clear()
+
+    def test_repeat_download_skips_rendering(self):
+        with mock.patch.object(
+            exports, 'render_shopping_list_pdf',
+            wraps=exports.render_shopping_list_pdf,
+        ) as render:
+            first = exports.get_shopping_list_pdf(INGREDIENTS, 'ru')
+            second = exports.get_shopping_list_pdf(INGREDIENTS, 'ru')
+            self.assertEqual(first, second)
+            self.assertEqual(render.call_count, 1)
+
+            exports.get_shopping_list_pdf(INGREDIENTS, 'en')
+            exports.get_shopping_list_pdf(INGREDIENTS[:1], 'ru')
+            self.assertEqual(render.call_count, 3)
+
+
+class TestShoppingListFormats(TestCase):
+    def setUp(self) -> None:
+        author = User.objects.create(**_.TEST_USER)
+        recipe = Recipe.objects.create(author=author, **_.TEST_RECIPE)
+        for name, amount, measurement_unit in INGREDIENTS:
+            RecipeIngredient.objects.create(
+                recipe=recipe,
+                ingredient=Ingredient.objects.create(
+                    name=name, measurement_unit=measurement_unit,
+                ),
+                amount=amount,
+            )
+        self.user = User.objects.create(**_.TEST_USER_2)
+        UserShoppingCart.objects.create(user=self.user).recipes.add(recipe)
+
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+    def download(self, export_format):
+        response = self.authorized_client.get(
+            _.DOWNLOAD_SHOPPING_CART_URL, {'format': export_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_pdf(self):
+        response = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_txt(self):
+        response = self.download('txt')
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(),
+            'мука — 100 г\nсоль — 3 г\n',
+        )
+
+    def test_csv(self):
+        response = self.download('csv')
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(),
+            'name,amount,measurement_unit\r\nмука,100,г\r\nсоль,3,г\r\n',
+        )
+
+    def test_pdf_by_default(self):
+        for accept in (None, 'application/json',
+                       'application/json, text/plain, */*', 'text/csv'):
+            with self.subTest(accept=accept):
+                headers = {'HTTP_ACCEPT': accept} if accept else {}
+                response = self.authorized_client.get(
+                    _.DOWNLOAD_SHOPPING_CART_URL, **headers
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], 'application/pdf')
+
+    def test_unknown_format(self):
+        for export_format in ('xls', 'json'):
+            with self.subTest(format=export_format):
+                response = self.authorized_client.get(
+                    _.DOWNLOAD_SHOPPING_CART_URL, {'format': export_format},
+                    HTTP_ACCEPT='application/pdf',
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    response['Content-Type'], 'application/json'
+                )
+                self.assertIn('detail', response.json())
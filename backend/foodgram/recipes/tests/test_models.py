@@ -132,6 +132,28 @@ class FavoriteRecipeTest(TestCase):
         )
         self.assertEqual(expected_output, str(test_favorite_recipe))
 
+    def test_change_many_returns_changed_rows(self):
+        """Rows linked by someone else meanwhile are not reported."""
+        test_user = User.objects.create(**_.TEST_USER)
+        first = Recipe.objects.create(author=test_user, **_.TEST_RECIPE)
+        second = Recipe.objects.create(author=test_user, **_.TEST_RECIPE_2)
+        FavoriteRecipe.objects.add(test_user.pk, first.pk)
+
+        added = FavoriteRecipe.objects.add_many(
+            test_user.pk, [first.pk, second.pk],
+        )
+        self.assertEqual(added, [second.pk])
+        self.assertEqual(
+            FavoriteRecipe.objects.add_many(test_user.pk, [second.pk]), [],
+        )
+        removed = FavoriteRecipe.objects.discard_many(
+            test_user.pk, [first.pk, second.pk],
+        )
+        self.assertEqual(sorted(removed), [first.pk, second.pk])
+        self.assertEqual(
+            FavoriteRecipe.objects.discard_many(test_user.pk, [first.pk]), [],
+        )
+
 
 class UserShoppingCartTest(TestCase):
     def test_object_name(self):
@@ -145,6 +167,32 @@ class UserShoppingCartTest(TestCase):
         expected_output = _.USER_SHOPPING_CART_STR_OUTPUT.format(test_user)
         self.assertEqual(expected_output, str(test_user_shopping_cart))
 
+    def test_ingredients_to_buy(self):
+        """Check ingredient amounts are summed across cart recipes."""
+        test_user = User.objects.create(**_.TEST_USER)
+        recipes = (
+            Recipe.objects.create(author=test_user, **_.TEST_RECIPE),
+            Recipe.objects.create(author=test_user, **_.TEST_RECIPE_2),
+        )
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        flour = Ingredient.objects.create(name='мука', measurement_unit='г')
+        for amount, recipe in enumerate(recipes, start=1):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=salt, amount=amount,
+            )
+        RecipeIngredient.objects.create(
+            recipe=recipes[0], ingredient=flour, amount=100,
+        )
+        test_user_shopping_cart = UserShoppingCart.objects.create(
+            user=test_user
+        )
+        test_user_shopping_cart.recipes.add(*recipes)
+
+        self.assertEqual(
+            list(test_user_shopping_cart.get_ingredients_to_buy()),
+            [('мука', 100, 'г'), ('соль', 3, 'г')],
+        )
+
 
 class ShoppingCartRecipeTest(TestCase):
     def test_object_name(self):
@@ -0,0 +1,270 @@
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.test import APIClient
+
+from ..catalog import catalog
+from ..models import Ingredient, Recipe, RecipeIngredient, Tag
+from . import constants as _
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TestRecipeQueryCount(TestCase):
+    """Pin recipe endpoints to a constant number of SQL statements."""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.author = User.objects.create(**_.TEST_USER)
+        self.user = User.objects.create(**_.TEST_USER_2)
+        self.user.follows.add(self.author)
+        self.tags = [
+            Tag.objects.create(
+                name=f'tag_{i}', color=f'#00000{i}', slug=f'tag_{i}',
+            )
+            for i in range(3)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'ingredient_{i}',
+                                      measurement_unit='г')
+            for i in range(3)
+        ]
+
+        self.unauthorized_client = APIClient()
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+        catalog.preload()
+
+    def create_recipes(self, count):
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name=f'recipe_{Recipe.objects.count()}',
+                text='text',
+                cooking_time=5,
+            )
+            recipe.tags.set(self.tags)
+            for ingredient in self.ingredients:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1,
+                )
+
+    def recipe_payload(self, name='payload'):
+        return {
+            'name': name,
+            'text': 'text',
+            'cooking_time': 10,
+            'image': _.TEST_IMAGE,
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 2}
+                for ingredient in self.ingredients
+            ],
+        }
+
+    def test_list(self):
+        # Anonymous requests also read the recipes version for the
+        # response cache.
+        clients = {
+            'authorized': (self.authorized_client, 5),
+            'unauthorized': (self.unauthorized_client, 6),
+        }
+        for name, (client, queries) in clients.items():
+            for count in (1, 6):
+                with self.subTest(client=name, recipes=count):
+                    Recipe.objects.all().delete()
+                    self.create_recipes(count)
+                    with self.assertNumQueries(queries):
+                        response = client.get(_.RECIPE_LIST_URL)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_cursor_list(self):
+        for count in (1, 6):
+            with self.subTest(recipes=count):
+                Recipe.objects.all().delete()
+                self.create_recipes(count)
+                with self.assertNumQueries(4):
+                    response = self.authorized_client.get(
+                        _.RECIPE_LIST_URL, {'pagination': 'cursor'}
+                    )
+                self.assertEqual(response.status_code, 200)
+
+    def test_detail(self):
+        self.create_recipes(1)
+        url = f'{_.RECIPE_LIST_URL}{Recipe.objects.get().id}/'
+        with self.assertNumQueries(5):
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['author']['is_subscribed'])
+
+    def test_create(self):
+        with self.assertNumQueries(16):
+            response = self.author_client.post(
+                _.RECIPE_LIST_URL, self.recipe_payload(), format='json',
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_update(self):
+        self.create_recipes(1)
+        url = f'{_.RECIPE_LIST_URL}{Recipe.objects.get().id}/'
+        with self.assertNumQueries(16):
+            response = self.author_client.put(
+                url, self.recipe_payload(), format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_with_unknown_ids(self):
+        payload = self.recipe_payload()
+        payload['tags'].append(999)
+        payload['ingredients'].extend([
+            {'id': 999, 'amount': 1}, {'id': 'abc', 'amount': 1},
+        ])
+        with self.assertNumQueries(1):
+            response = self.author_client.post(
+                _.RECIPE_LIST_URL, payload, format='json',
+            )
+        self.assertEqual(response.status_code, 400)
+        messages = PrimaryKeyRelatedField.default_error_messages
+        does_not_exist = str(messages['does_not_exist']).format(pk_value=999)
+        incorrect_type = str(messages['incorrect_type']).format(
+            data_type='str',
+        )
+        self.assertEqual(response.json()['tags'], [does_not_exist])
+        self.assertEqual(response.json()['ingredients'][3:], [
+            {'id': [does_not_exist]}, {'id': [incorrect_type]},
+        ])
+
+    def test_update_ingredients_diff(self):
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        untouched = RecipeIngredient.objects.get(
+            recipe=recipe, ingredient=self.ingredients[0],
+        )
+        payload = self.recipe_payload()
+        payload['ingredients'] = [
+            {'id': self.ingredients[0].id, 'amount': 1},
+            {'id': self.ingredients[1].id, 'amount': 5},
+        ]
+        response = self.author_client.put(
+            f'{_.RECIPE_LIST_URL}{recipe.id}/', payload, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(recipe.ingredients.values_list('id', 'ingredient', 'amount')),
+            [
+                (untouched.id, self.ingredients[0].id, 1),
+                (untouched.id + 1, self.ingredients[1].id, 5),
+            ],
+        )
+
+    def test_toggles(self):
+        # Wrapper and link INSERTs, counter UPDATE, savepoint pair; the
+        # size of the user's collection does not matter.
+        for count in (1, 6):
+            Recipe.objects.all().delete()
+            self.create_recipes(count)
+            recipe = Recipe.objects.last()
+            for other in Recipe.objects.exclude(pk=recipe.pk):
+                self.authorized_client.get(
+                    f'{_.RECIPE_LIST_URL}{other.id}/favorite/'
+                )
+                self.authorized_client.get(
+                    f'{_.RECIPE_LIST_URL}{other.id}/shopping_cart/'
+                )
+            for action in ('favorite', 'shopping_cart'):
+                url = f'{_.RECIPE_LIST_URL}{recipe.id}/{action}/'
+                with self.subTest(recipes=count, action=action):
+                    with self.assertNumQueries(6):
+                        response = self.authorized_client.get(url)
+                    self.assertEqual(response.status_code, 201)
+                    with self.assertNumQueries(6):
+                        response = self.authorized_client.get(url)
+                    self.assertEqual(response.status_code, 400)
+                    with self.assertNumQueries(4):
+                        response = self.authorized_client.delete(url)
+                    self.assertEqual(response.status_code, 204)
+
+    def test_change_many(self):
+        # Membership check, wrapper INSERT, bulk INSERT or DELETE, counter
+        # UPDATE, savepoint pair.
+        for count in (1, 6):
+            Recipe.objects.all().delete()
+            self.create_recipes(count)
+            payload = {
+                'recipes': list(Recipe.objects.values_list('pk', flat=True))
+            }
+            for url in (_.FAVORITE_MANY_URL, _.SHOPPING_CART_MANY_URL):
+                with self.subTest(recipes=count, url=url):
+                    with self.assertNumQueries(6):
+                        response = self.authorized_client.post(
+                            url, payload, format='json'
+                        )
+                    self.assertEqual(response.status_code, 200)
+                    with self.assertNumQueries(5):
+                        response = self.authorized_client.delete(
+                            url, payload, format='json'
+                        )
+                    self.assertEqual(response.status_code, 200)
+
+
+class TestSubscriptionsQueryCount(TestCase):
+    def setUp(self) -> None:
+        self.user = User.objects.create(**_.TEST_USER)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def follow_authors(self, count, recipes_per_author=3):
+        for i in range(User.objects.count(), User.objects.count() + count):
+            author = User.objects.create(
+                username=f'author_{i}', email=f'author_{i}@test.com',
+            )
+            self.user.follows.add(author)
+            for j in range(recipes_per_author):
+                Recipe.objects.create(
+                    author=author, name=f'recipe_{i}_{j}', text='text',
+                    cooking_time=5,
+                )
+
+    def test_subscriptions(self):
+        for count in (1, 10):
+            with self.subTest(authors=count):
+                self.follow_authors(count)
+                with self.assertNumQueries(3):
+                    response = self.client.get(
+                        _.SUBSCRIPTIONS_URL, {'recipes_limit': 2}
+                    )
+                self.assertEqual(response.status_code, 200)
+                for author in response.data['results']:
+                    self.assertTrue(author['is_subscribed'])
+                    self.assertEqual(author['recipes_count'], 3)
+                    self.assertEqual(len(author['recipes']), 2)
+
+    def test_subscriptions_without_limit(self):
+        self.follow_authors(2)
+        response = self.client.get(_.SUBSCRIPTIONS_URL)
+        self.assertEqual(response.data['count'], 2)
+        recipes = response.data['results'][0]['recipes']
+        self.assertEqual(len(recipes), 3)
+        self.assertEqual(
+            [recipe['id'] for recipe in recipes],
+            sorted(recipe['id'] for recipe in recipes),
+        )
+
+    def test_invalid_recipes_limit(self):
+        self.follow_authors(1)
+        response = self.client.get(
+            _.SUBSCRIPTIONS_URL, {'recipes_limit': 'all'}
+        )
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,116 @@
+import shutil
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from foodgram.cache import SingleFlight
+from foodgram.response_cache import get_response_cache
+from rest_framework.test import APIClient
+
+from ..models import Recipe, Tag
+from . import constants as _
+
+User = get_user_model()
+
+CACHE_DIR = tempfile.mkdtemp()
+
+
+class TestSingleFlight(SimpleTestCase):
+    def test_concurrent_calls_run_once(self):
+        single_flight = SingleFlight()
+        calls = []
+        results = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.05)
+            return 'page'
+
+        def request():
+            results.append(single_flight.do('key', build))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('page', False)] * 4 + [
+            ('page', True)
+        ])
+        self.assertEqual(single_flight.do('key', build), ('page', True))
+
+
+@override_settings(RECIPE_RESPONSE_CACHE={
+    'BACKEND': 'foodgram.cache.FileSystemStore',
+    'OPTIONS': {'location': CACHE_DIR, 'max_age': 60},
+})
+class TestAnonymousResponseCache(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        get_response_cache.cache_clear()
+        get_response_cache('RECIPE_RESPONSE_CACHE').clear()
+        self.author = User.objects.create(**_.TEST_USER)
+        self.tag = Tag.objects.create(**_.TEST_TAG)
+        self.recipe = Recipe.objects.create(
+            author=self.author, **_.TEST_RECIPE
+        )
+        self.client = APIClient()
+
+    def tearDown(self) -> None:
+        get_response_cache.cache_clear()
+
+    def get(self, url=_.RECIPE_LIST_URL, client=None, **params):
+        response = (client or self.client).get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_hit(self):
+        first = self.get(limit=2, tags=self.tag.slug)
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(1):
+            second = self.get(tags=self.tag.slug, limit=2)
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Type'], first['Content-Type'])
+
+        detail_url = f'{_.RECIPE_LIST_URL}{self.recipe.id}/'
+        self.assertEqual(self.get(detail_url)['X-Cache'], 'MISS')
+        self.assertEqual(self.get(detail_url)['X-Cache'], 'HIT')
+
+    def test_writes_invalidate(self):
+        changes = (
+            lambda: Recipe.objects.get().save(),
+            lambda: self.recipe.tags.add(self.tag),
+            lambda: self.recipe.tags.clear(),
+            lambda: Recipe.objects.create(
+                author=self.author, **_.TEST_RECIPE_2
+            ),
+        )
+        for number, change in enumerate(changes):
+            with self.subTest(change=number):
+                self.get()
+                change()
+                self.assertEqual(self.get()['X-Cache'], 'MISS')
+        self.assertEqual(self.get().json()['count'], 2)
+
+    def test_authorized_not_cached(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        self.get(client=client)
+        self.assertNotIn('X-Cache', self.get(client=client))
+
+    def test_errors_not_cached(self):
+        url = f'{_.RECIPE_LIST_URL}0/'
+        for _attempt in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn('X-Cache', response)
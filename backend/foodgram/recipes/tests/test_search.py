@@ -0,0 +1,110 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from ..models import Ingredient
+from ..search import ingredient_index
+from . import constants as _
+
+INGREDIENTS = (
+    ('абрикосовое варенье', 'г'),
+    ('абрикосовый джем', 'г'),
+    ('Абрикосы', 'шт.'),
+    ('авокадо', 'шт.'),
+    ('баклажаны', 'г'),
+)
+
+
+class TestIngredientIndex(TestCase):
+    def setUp(self) -> None:
+        ingredient_index.invalidate()
+        for name, measurement_unit in INGREDIENTS:
+            Ingredient.objects.create(
+                name=name, measurement_unit=measurement_unit,
+            )
+        self.client = APIClient()
+
+    def search(self, prefix, limit=None):
+        return [
+            ingredient['name']
+            for ingredient in ingredient_index.search(prefix, limit)
+        ]
+
+    def test_prefix_search(self):
+        self.assertEqual(
+            self.search('абри'),
+            ['абрикосовое варенье', 'абрикосовый джем', 'Абрикосы'],
+        )
+        self.assertEqual(self.search('абрикосовы'), ['абрикосовый джем'])
+        self.assertEqual(self.search('в'), [])
+
+    def test_limit(self):
+        self.assertEqual(
+            self.search('а', limit=2),
+            ['абрикосовое варенье', 'абрикосовый джем'],
+        )
+
+    def test_similar_search(self):
+        results = [
+            ingredient['name']
+            for ingredient in ingredient_index.search_similar(
+                'абрикосовй джем'
+            )
+        ]
+        self.assertEqual(results[0], 'абрикосовый джем')
+        self.assertNotIn('баклажаны', results)
+
+    def test_similar_search_ranks_prefix_first(self):
+        results = [
+            ingredient['name']
+            for ingredient in ingredient_index.search_similar(
+                'абрикосы', limit=2
+            )
+        ]
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0], 'Абрикосы')
+
+    def test_incremental_updates(self):
+        self.search('а')
+
+        ingredient = Ingredient.objects.create(
+            name='ананас', measurement_unit='шт.'
+        )
+        self.assertEqual(self.search('ан'), ['ананас'])
+
+        ingredient.name = 'банан'
+        ingredient.save()
+        self.assertEqual(self.search('ан'), [])
+        self.assertEqual(self.search('ба'), ['баклажаны', 'банан'])
+
+        self.assertEqual(
+            ingredient_index.search_similar('банна')[0]['name'], 'банан'
+        )
+
+        ingredient.delete()
+        self.assertEqual(self.search('ба'), ['баклажаны'])
+        self.assertEqual(ingredient_index.search_similar('банна'), [])
+
+    def test_endpoint(self):
+        response = self.client.get(
+            _.INGREDIENT_LIST_URL, {'name': 'АБ', 'limit': 1}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(
+            set(response.data[0]), set(_.INGREDIENT_SERIALIZER)
+        )
+
+        response = self.client.get(
+            _.INGREDIENT_LIST_URL, {'name': 'авакадо', 'mode': 'fuzzy'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]['name'], 'авокадо')
+
+        bad_params = (
+            {'name': 'аб', 'limit': 'all'},
+            {'name': 'аб', 'mode': 'exact'},
+        )
+        for params in bad_params:
+            with self.subTest(params=params):
+                response = self.client.get(_.INGREDIENT_LIST_URL, params)
+                self.assertEqual(response.status_code, 400)
@@ -1,5 +1,9 @@
-from django.test import TestCase
+import os
 
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import ValidationError
+
+from ..fields import RecipeImageField
 from ..serializers import (IngredientSerializer, RecipeSerializer,
                            RecipeShortSerializer, TagExplicitSerializer)
 from . import constants as _
@@ -43,3 +47,27 @@ class TestRecipeShoppingCartSerializer(TestCase):
         for field in fields:
             with self.subTest(field=field):
                 self.assertTrue(field in actual_fields)
+
+
+class TestRecipeImageField(TestCase):
+    def decode(self, field, data):
+        self.decoded = RecipeImageField.decode_base64(field, data)
+        return self.decoded
+
+    def test_base64_goes_to_temporary_file(self):
+        field = RecipeImageField()
+        image = field.to_internal_value(_.TEST_IMAGE)
+        self.addCleanup(image.close)
+        self.assertTrue(os.path.isfile(image.temporary_file_path()))
+        self.assertEqual(image.size, os.path.getsize(
+            image.temporary_file_path()
+        ))
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=0)
+    def test_rejected_file_is_closed(self):
+        field = RecipeImageField()
+        field.decode_base64 = lambda data: self.decode(field, data)
+        with self.assertRaises(ValidationError):
+            field.to_internal_value(_.TEST_IMAGE)
+        self.assertTrue(self.decoded.closed)
+        self.assertFalse(os.path.exists(self.decoded.file.name))
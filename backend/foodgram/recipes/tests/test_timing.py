@@ -0,0 +1,76 @@
+import logging
+import re
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from ..models import Tag
+from . import constants as _
+
+SERVER_TIMING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1,
+    'HEADER': True,
+    'SLOW_REQUEST_MS': 0,
+    'SLOW_QUERY_MS': 0,
+    'MAX_SLOW_QUERIES': 1,
+}
+HEADER = re.compile(
+    r'db;dur=[\d.]+;desc="(\d+) queries", serialize;dur=([\d.]+), '
+    r'render;dur=([\d.]+), total;dur=([\d.]+)'
+)
+
+
+class TestServerTiming(TestCase):
+    def setUp(self) -> None:
+        Tag.objects.create(**_.TEST_TAG)
+
+    @override_settings(SERVER_TIMING=SERVER_TIMING)
+    def test_header_and_log(self):
+        with self.assertLogs('foodgram.timing', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as captured:
+                response = APIClient().get(_.TAG_LIST_URL)
+
+        self.assertEqual(response.status_code, 200)
+        match = HEADER.fullmatch(response['Server-Timing'])
+        self.assertIsNotNone(match, response['Server-Timing'])
+        queries, serialize, render, total = match.groups()
+        self.assertEqual(int(queries), len(captured))
+        self.assertLessEqual(float(serialize), float(total))
+        self.assertLessEqual(float(render), float(total))
+
+        record, = logs.records
+        self.assertEqual(record.path, _.TAG_LIST_URL)
+        self.assertEqual(record.status, 200)
+        self.assertEqual(record.queries, len(captured))
+        # Only the slowest query is kept, without its parameters.
+        slow_query, = record.slow_queries
+        self.assertTrue(slow_query['sql'].startswith('SELECT'))
+        self.assertNotIn("'tags'", slow_query['sql'])
+
+    @override_settings(SERVER_TIMING={
+        **SERVER_TIMING, 'SLOW_REQUEST_MS': 60 * 1000, 'HEADER': False,
+    })
+    def test_fast_request_is_not_logged(self):
+        # assertLogs fails when nothing is logged.
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('foodgram.timing'):
+                response = APIClient().get(_.TAG_LIST_URL)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(SERVER_TIMING={**SERVER_TIMING, 'SAMPLE_RATE': 0})
+    def test_not_sampled(self):
+        response = APIClient().get(_.TAG_LIST_URL)
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(SERVER_TIMING={**SERVER_TIMING, 'ENABLED': False})
+    def test_disabled(self):
+        response = APIClient().get(_.TAG_LIST_URL)
+        self.assertNotIn('Server-Timing', response)
+
+    def test_slow_requests_are_not_dropped(self):
+        logger = logging.getLogger('foodgram.timing')
+        self.assertTrue(logger.handlers)
+        self.assertTrue(logger.isEnabledFor(logging.INFO))
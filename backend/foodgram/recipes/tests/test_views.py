@@ -0,0 +1,582 @@
+import base64
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from ..images import iter_variant_files
+from ..models import DataVersion, FavoriteRecipe, Ingredient, Recipe, Tag
+from ..serializers import RecipeSerializer
+from ..tasks import save_image_variants
+from . import constants as _
+
+User = get_user_model()
+
+
+class TestRecipeUserFlags(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create(**_.TEST_USER)
+        self.recipe = Recipe.objects.create(
+            author=self.author, **_.TEST_RECIPE
+        )
+        self.other_recipe = Recipe.objects.create(
+            author=self.author, **_.TEST_RECIPE_2
+        )
+        self.user = User.objects.create(**_.TEST_USER_2)
+
+        self.unauthorized_client = APIClient()
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+    def get_flags(self, client, **params):
+        response = client.get(_.RECIPE_LIST_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return {
+            recipe['id']: (
+                recipe['is_favorited'], recipe['is_in_shopping_cart']
+            )
+            for recipe in response.data['results']
+        }
+
+    def test_flags_for_authorized_user(self):
+        self.authorized_client.get(_.FAVORITE_URL)
+        self.authorized_client.get(_.SHOPPING_CART_URL)
+
+        flags = self.get_flags(self.authorized_client)
+        self.assertEqual(flags[self.recipe.id], (True, True))
+        self.assertEqual(flags[self.other_recipe.id], (False, False))
+
+    def test_flags_for_unauthorized_user(self):
+        self.authorized_client.get(_.FAVORITE_URL)
+
+        flags = self.get_flags(self.unauthorized_client)
+        self.assertEqual(flags[self.recipe.id], (False, False))
+
+    def test_filter_by_flags(self):
+        self.authorized_client.get(_.FAVORITE_URL)
+
+        favorited = self.get_flags(self.authorized_client, is_favorited=1)
+        self.assertEqual(list(favorited), [self.recipe.id])
+
+        not_favorited = self.get_flags(
+            self.authorized_client, is_favorited=0
+        )
+        self.assertEqual(list(not_favorited), [self.other_recipe.id])
+
+        in_cart = self.get_flags(
+            self.authorized_client, is_in_shopping_cart=1
+        )
+        self.assertEqual(in_cart, {})
+
+
+class TestRecipeSearch(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create(**_.TEST_USER)
+        self.tag = Tag.objects.create(**_.TEST_TAG)
+        self.soup = Recipe.objects.create(
+            author=self.author, name='Борщ', text='Суп со свёклой',
+            cooking_time=90,
+        )
+        self.soup.tags.add(self.tag)
+        self.salad = Recipe.objects.create(
+            author=self.author, name='Винегрет', text='Салат со свёклой',
+            cooking_time=30,
+        )
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get(_.RECIPE_LIST_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_search_name_and_text(self):
+        self.assertEqual(self.search(search='Борщ'), {self.soup.id})
+        self.assertEqual(
+            self.search(search='свёклой'), {self.soup.id, self.salad.id}
+        )
+        self.assertEqual(self.search(search='пицца'), set())
+
+    def test_search_with_filters(self):
+        self.assertEqual(
+            self.search(search='свёклой', tags=self.tag.slug),
+            {self.soup.id},
+        )
+
+
+class TestRecipeCursorPagination(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create(**_.TEST_USER)
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f'recipe_{i}', text='text',
+                cooking_time=5,
+            )
+            for i in range(8)
+        ]
+        self.client = APIClient()
+
+    def test_pages(self):
+        ids = []
+        url = _.RECIPE_LIST_URL
+        params = {'pagination': 'cursor', 'limit': 3}
+        while url is not None:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url, params = response.data['next'], None
+        self.assertEqual(
+            ids, [recipe.id for recipe in reversed(self.recipes)]
+        )
+
+    def test_count(self):
+        for mode in ('exact', 'approximate'):
+            with self.subTest(count=mode):
+                response = self.client.get(
+                    _.RECIPE_LIST_URL, {'pagination': 'cursor', 'count': mode}
+                )
+                self.assertEqual(response.data['count'], len(self.recipes))
+
+
+class TestRecipeCounters(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create(**_.TEST_USER)
+        self.recipe = Recipe.objects.create(
+            author=self.author, **_.TEST_RECIPE
+        )
+        self.other_recipe = Recipe.objects.create(
+            author=self.author, **_.TEST_RECIPE_2
+        )
+        self.user = User.objects.create(**_.TEST_USER_2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_favorites_and_cart_counters(self):
+        self.client.get(_.FAVORITE_URL)
+        self.client.get(_.FAVORITE_URL)
+        self.client.get(_.SHOPPING_CART_URL)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.in_carts_count, 1)
+
+        self.client.delete(_.FAVORITE_URL)
+        self.client.delete(_.SHOPPING_CART_URL)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertEqual(self.recipe.in_carts_count, 0)
+
+    def test_toggle_errors(self):
+        missing_url = f'{_.RECIPE_LIST_URL}0/favorite/'
+        cases = (
+            (_.FAVORITE_URL, 'favorites_count'),
+            (_.SHOPPING_CART_URL, 'in_carts_count'),
+        )
+        for url, counter in cases:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.delete(url).status_code, 400)
+                self.assertEqual(self.client.get(url).status_code, 201)
+                self.assertEqual(self.client.get(url).status_code, 400)
+                self.recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, counter), 1)
+
+        for method in (self.client.get, self.client.delete):
+            self.assertEqual(method(missing_url).status_code, 404)
+
+    def test_change_many(self):
+        ids = [self.recipe.id, 999, self.other_recipe.id, self.recipe.id]
+        self.client.get(_.FAVORITE_URL)
+        cases = (
+            (_.FAVORITE_MANY_URL, 'favorites_count', 'exists'),
+            (_.SHOPPING_CART_MANY_URL, 'in_carts_count', 'added'),
+        )
+        for url, counter, first_status in cases:
+            with self.subTest(url=url):
+                response = self.client.post(
+                    url, {'recipes': ids}, format='json'
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['results'], [
+                    {'id': self.recipe.id, 'status': first_status},
+                    {'id': 999, 'status': 'not_found'},
+                    {'id': self.other_recipe.id, 'status': 'added'},
+                ])
+                response = self.client.delete(
+                    url, {'recipes': [self.other_recipe.id, 999]},
+                    format='json',
+                )
+                self.assertEqual(response.data['results'], [
+                    {'id': self.other_recipe.id, 'status': 'removed'},
+                    {'id': 999, 'status': 'not_found'},
+                ])
+                response = self.client.delete(
+                    url, {'recipes': [self.other_recipe.id]}, format='json',
+                )
+                self.assertEqual(response.data['results'], [
+                    {'id': self.other_recipe.id, 'status': 'absent'},
+                ])
+                self.recipe.refresh_from_db()
+                self.other_recipe.refresh_from_db()
+                self.assertEqual(getattr(self.recipe, counter), 1)
+                self.assertEqual(getattr(self.other_recipe, counter), 0)
+
+    @override_settings(RECIPE_BULK_MAX_SIZE=2)
+    def test_change_many_validation(self):
+        for recipes in ([], [1, 2, 3], [0], ['a'], None):
+            with self.subTest(recipes=recipes):
+                response = self.client.post(
+                    _.FAVORITE_MANY_URL, {'recipes': recipes}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+        response = APIClient().post(
+            _.FAVORITE_MANY_URL, {'recipes': [1]}, format='json'
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_counters_on_user_delete(self):
+        self.client.get(_.FAVORITE_URL)
+        self.client.get(_.SHOPPING_CART_URL)
+        self.user.delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+        self.assertEqual(self.recipe.in_carts_count, 0)
+
+    def test_counters_in_admin(self):
+        self.client.get(_.FAVORITE_URL)
+        favorite = FavoriteRecipe.objects.get()
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin',
+        )
+        self.client.force_login(admin)
+        url = f'/admin/recipes/userfavorites/{self.user.pk}/change/'
+        # The inline of a related_name='+' foreign key is prefixed '-1'.
+        data = {
+            'user': self.user.pk,
+            '-1-TOTAL_FORMS': 1,
+            '-1-INITIAL_FORMS': 1,
+            '-1-0-id': favorite.pk,
+            '-1-0-user': self.user.pk,
+            '-1-0-recipe': self.other_recipe.pk,
+        }
+        cases = (
+            ({}, (0, 1)),
+            ({'-1-0-DELETE': 'on'}, (0, 0)),
+        )
+        for changes, expected in cases:
+            with self.subTest(changes=changes):
+                response = self.client.post(url, {**data, **changes})
+                self.assertEqual(response.status_code, 302)
+                self.recipe.refresh_from_db()
+                self.other_recipe.refresh_from_db()
+                self.assertEqual(
+                    (self.recipe.favorites_count,
+                     self.other_recipe.favorites_count),
+                    expected,
+                )
+
+    def test_recipes_counter(self):
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+        self.other_recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+
+    def test_ordering_by_counter(self):
+        self.client.get(_.FAVORITE_URL)
+        response = self.client.get(
+            _.RECIPE_LIST_URL, {'ordering': '-favorites_count'}
+        )
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data['results']],
+            [self.recipe.id, self.other_recipe.id],
+        )
+        self.assertEqual(response.data['results'][0]['favorites_count'], 1)
+
+    def test_reconcile_counters(self):
+        self.client.get(_.FAVORITE_URL)
+        Recipe.objects.update(favorites_count=5, in_carts_count=3)
+        User.objects.update(recipes_count=0)
+
+        out = StringIO()
+        call_command('reconcilecounters', batch_size=1, stdout=out)
+
+        self.recipe.refresh_from_db()
+        self.other_recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.other_recipe.favorites_count, 0)
+        self.assertEqual(self.recipe.in_carts_count, 0)
+        self.assertEqual(self.author.recipes_count, 2)
+        self.assertIn('Recipe.favorites_count: fixed 2 rows', out.getvalue())
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TestRecipeImageUpload(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self) -> None:
+        self.author = User.objects.create(**_.TEST_USER)
+        self.tag = Tag.objects.create(**_.TEST_TAG)
+        self.ingredient = Ingredient.objects.create(**_.TEST_INGREDIENT)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.image = base64.b64decode(_.TEST_IMAGE.split(',')[1])
+
+    def multipart_payload(self):
+        return {
+            'name': 'multipart',
+            'text': 'text',
+            'cooking_time': 10,
+            'tags': [self.tag.id],
+            'ingredients[0]id': self.ingredient.id,
+            'ingredients[0]amount': 3,
+            'image': SimpleUploadedFile('photo.png', self.image),
+        }
+
+    def test_multipart_create(self):
+        response = self.client.post(
+            _.RECIPE_LIST_URL, self.multipart_payload(), format='multipart',
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        recipe = Recipe.objects.get()
+        self.assertTrue(recipe.image.name.endswith('.png'))
+        self.assertEqual(recipe.image.read(), self.image)
+        self.assertEqual(response.data['ingredients'][0]['amount'], 3)
+
+    def test_update_keeps_concurrent_changes(self):
+        self.client.post(
+            _.RECIPE_LIST_URL, self.multipart_payload(), format='multipart',
+        )
+        recipe = Recipe.objects.get()
+
+        def toggle_meanwhile(*args):
+            Recipe.objects.filter(pk=recipe.pk).increment('favorites_count')
+            Recipe.objects.filter(pk=recipe.pk).update(
+                image_variants={'source': 'other.png'},
+            )
+
+        with mock.patch.object(
+            RecipeSerializer, 'update_ingredients',
+            side_effect=toggle_meanwhile,
+        ):
+            response = self.client.put(
+                f'{_.RECIPE_LIST_URL}{recipe.pk}/',
+                {**self.multipart_payload(), 'name': 'renamed'},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'renamed')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.image_variants, {'source': 'other.png'})
+
+    def run_jobs(self):
+        call_command('runworker', burst=True, stdout=StringIO())
+
+    def test_image_variants(self):
+        response = self.client.post(
+            _.RECIPE_LIST_URL, self.multipart_payload(), format='multipart',
+        )
+        self.assertIsNone(response.data['image_variants'])
+
+        self.run_jobs()
+        response = self.client.get(
+            f'{_.RECIPE_LIST_URL}{response.data["id"]}/'
+        )
+        variants = response.data['image_variants']
+        self.assertEqual(
+            set(variants), {'card', 'detail', 'retina', 'srcset'},
+        )
+        self.assertEqual(variants['card']['width'], 1)
+        self.assertTrue(variants['card']['webp'].endswith('_card.webp'))
+        self.assertTrue(variants['srcset']['jpeg'].endswith('_retina.jpg 1w'))
+
+        recipe = Recipe.objects.get()
+        names = list(iter_variant_files(recipe.image_variants))
+        self.assertEqual(len(names), 6)
+        self.assertTrue(all(default_storage.exists(name) for name in names))
+
+        recipe.delete()
+        self.run_jobs()
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+
+    def test_generate_variants_command(self):
+        self.client.post(
+            _.RECIPE_LIST_URL, self.multipart_payload(), format='multipart',
+        )
+        Recipe.objects.update(image_variants={})
+        updated = Recipe.objects.get().updated
+        version = DataVersion.objects.get_version(DataVersion.RECIPES)
+
+        out = StringIO()
+        call_command('generateimagevariants', workers=1, stdout=out)
+
+        recipe = Recipe.objects.get()
+        self.assertEqual(recipe.image_variants['source'], recipe.image.name)
+        self.assertGreater(recipe.updated, updated)
+        self.assertGreater(
+            DataVersion.objects.get_version(DataVersion.RECIPES), version
+        )
+        self.assertIn('Generated variants for 1 recipes', out.getvalue())
+
+    def test_variants_of_replaced_image_are_dropped(self):
+        self.client.post(
+            _.RECIPE_LIST_URL, self.multipart_payload(), format='multipart',
+        )
+        self.run_jobs()
+        recipe = Recipe.objects.get()
+        saved = save_image_variants(
+            recipe.pk, 'recipes/images/replaced.png', recipe.image_variants,
+            {'source': 'recipes/images/replaced.png'},
+        )
+        self.assertFalse(saved)
+        self.assertEqual(
+            Recipe.objects.get().image_variants, recipe.image_variants
+        )
+
+    def test_base64_create(self):
+        payload = self.multipart_payload()
+        payload.pop('ingredients[0]id')
+        payload.pop('ingredients[0]amount')
+        payload['ingredients'] = [{'id': self.ingredient.id, 'amount': 1}]
+        payload['image'] = _.TEST_IMAGE
+        response = self.client.post(
+            _.RECIPE_LIST_URL, payload, format='json',
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Recipe.objects.get().image.read(), self.image)
+
+    def test_limits(self):
+        limits = {
+            'RECIPE_IMAGE_MAX_SIZE': len(self.image) - 1,
+            'RECIPE_IMAGE_MAX_PIXELS': 0,
+        }
+        for setting, value in limits.items():
+            for image in (
+                SimpleUploadedFile('photo.png', self.image), _.TEST_IMAGE,
+            ):
+                with self.subTest(setting=setting, image=type(image)):
+                    payload = self.multipart_payload()
+                    payload['image'] = image
+                    with override_settings(**{setting: value}):
+                        response = self.client.post(
+                            _.RECIPE_LIST_URL, payload, format='multipart',
+                        )
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_invalid_image(self):
+        for image in ('data:image/png;base64,!!!', 'bm90IGFuIGltYWdl'):
+            with self.subTest(image=image):
+                payload = self.multipart_payload()
+                payload['image'] = image
+                response = self.client.post(
+                    _.RECIPE_LIST_URL, payload, format='multipart',
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.data)
+
+
+class TestConditionalGet(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create(**_.TEST_USER)
+        self.user = User.objects.create(**_.TEST_USER_2)
+        self.tag = Tag.objects.create(**_.TEST_TAG)
+        self.ingredient = Ingredient.objects.create(**_.TEST_INGREDIENT)
+        self.recipe = Recipe.objects.create(
+            author=self.author, **_.TEST_RECIPE
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_not_modified(self, url, etag, queries=0, **params):
+        with self.assertNumQueries(queries):
+            response = self.client.get(
+                url, params, HTTP_IF_NONE_MATCH=etag,
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_catalogues(self):
+        urls = {
+            _.TAG_LIST_URL: lambda: Tag.objects.create(
+                name='new', color='#000000', slug='new',
+            ),
+            _.INGREDIENT_LIST_URL: lambda: self.ingredient.delete(),
+        }
+        for url, change in urls.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('Last-Modified', response)
+                self.assert_not_modified(url, etag)
+
+                change()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_ingredient_search(self):
+        response = self.client.get(_.INGREDIENT_LIST_URL, {'name': 'te'})
+        self.assertEqual(len(response.data), 1)
+        self.assert_not_modified(
+            _.INGREDIENT_LIST_URL, response['ETag'], name='te',
+        )
+
+    def test_recipe_detail(self):
+        url = f'{_.RECIPE_LIST_URL}{self.recipe.id}/'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+        self.assertNotIn('Last-Modified', response)
+        self.assert_not_modified(url, etag, queries=1)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT',
+        )
+        self.assertEqual(response.status_code, 200)
+
+        self.client.get(f'{url}favorite/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['is_favorited'])
+
+        anonymous = APIClient().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(anonymous.status_code, 200)
+
+        self.recipe.tags.add(self.tag)
+
+        def rename_tag():
+            self.tag.name = 'new'
+            self.tag.save()
+
+        changes = (
+            rename_tag,
+            self.ingredient.save,
+            lambda: User.objects.filter(pk=self.author.pk).update(
+                first_name='new',
+            ),
+        )
+        for change in changes:
+            response = self.client.get(url)
+            etag = response['ETag']
+            self.assert_not_modified(url, etag, queries=1)
+            change()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(f'{_.RECIPE_LIST_URL}0/').status_code, 404)
@@ -1,46 +1,183 @@
 import io
 
-from django.http import FileResponse
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.translation import get_language
 from django.utils.translation import gettext_lazy as _
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.platypus import Paragraph, SimpleDocTemplate, Table
-from rest_framework import filters, permissions, status
+from foodgram.conditional import ConditionalGetMixin, make_etag
+from foodgram.pagination import RecipePagination
+from foodgram.response_cache import AnonymousResponseCacheMixin
+from rest_framework import permissions, status
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotFound, ParseError, ValidationError
 from rest_framework.generics import get_object_or_404
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from .filters import IngredientSearchFilter, RecipeFilter
-from .models import Ingredient, Recipe, Tag, UserFavorites, UserShoppingCart
+from .catalog import catalog
+from .exports import (DEFAULT_EXPORT_FORMAT, EXPORT_CONTENT_TYPES,
+                      get_shopping_list_pdf, iter_shopping_list_csv,
+                      iter_shopping_list_text)
+from .filters import RecipeFilter, RecipeOrderingFilter
+from .models import (DataVersion, FavoriteRecipe, Ingredient, Recipe,
+                     ShoppingCartRecipe, Tag, UserShoppingCart)
+from .negotiation import IgnoreClientContentNegotiation
 from .permissions import IsOwnerOrReadOnly
-from .serializers import (IngredientSerializer, RecipeSerializer,
-                          RecipeShortSerializer, TagExplicitSerializer)
+from .search import ingredient_index, search_similar_in_database
+from .serializers import (IngredientSerializer, RecipeIdListSerializer,
+                          RecipeSerializer, RecipeShortSerializer,
+                          TagExplicitSerializer)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class CatalogViewSetMixin(ConditionalGetMixin):
+    """
+    Serve a catalogue from the in-process catalog cache and validate
+    cached responses against the table version.
+    """
+    version_name = None
+    cache_control = {
+        'public': True,
+        'max_age': settings.CATALOG_CACHE_MAX_AGE,
+    }
+
+    def get_table(self):
+        return catalog[self.version_name]
+
+    def get_validators(self):
+        state = self.get_table().get_state()
+        return make_etag(self.version_name, state.version), state.updated
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(self.list_cached, request)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(self.retrieve_cached, request)
+
+    def list_cached(self, request):
+        return Response(self.get_table().all_data())
+
+    def retrieve_cached(self, request):
+        try:
+            pk = int(self.kwargs[self.lookup_field])
+        except ValueError:
+            raise NotFound
+        data = self.get_table().get_data(pk)
+        if data is None:
+            raise NotFound
+        return Response(data)
+
+
+class TagViewSet(CatalogViewSetMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagExplicitSerializer
     pagination_class = None
+    version_name = DataVersion.TAGS
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogViewSetMixin, ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = (IngredientSearchFilter,)
-    search_fields = ('^name',)
+    version_name = DataVersion.INGREDIENTS
+    search_param = 'name'
+    search_mode_param = 'mode'
+    limit_param = 'limit'
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get(self.search_param)
+        if not query:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(self.search, request, query)
 
+    def search(self, request, query):
+        # Refreshing the catalog rebuilds the index on ingredient changes
+        # made by other workers.
+        catalog.ingredients.get_state()
+        mode = request.query_params.get(self.search_mode_param, 'prefix')
+        if mode == 'prefix':
+            return Response(ingredient_index.search(query, self.get_limit()))
+        if mode == 'fuzzy':
+            return Response(self.search_similar(query, self.get_limit()))
+        raise ParseError(
+            _('{} query param must be one of: prefix, fuzzy.').format(
+                self.search_mode_param
+            )
+        )
+
+    @staticmethod
+    def search_similar(query, limit):
+        config = settings.INGREDIENT_FUZZY_SEARCH
+        if (
+            config['BACKEND'] == 'database'
+            and connection.vendor == 'postgresql'
+        ):
+            search = search_similar_in_database
+        else:
+            search = ingredient_index.search_similar
+        return search(query, limit, threshold=config['THRESHOLD'])
+
+    def get_limit(self):
+        limit = self.request.query_params.get(
+            self.limit_param, settings.INGREDIENT_SEARCH_LIMIT
+        )
+        try:
+            return int(limit)
+        except ValueError:
+            raise ParseError(
+                _('{} query param must be an integer.').format(
+                    self.limit_param
+                )
+            )
 
-class RecipeViewSet(ModelViewSet):
+
+class RecipeViewSet(ConditionalGetMixin, AnonymousResponseCacheMixin,
+                    ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (IsOwnerOrReadOnly,)
-    filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
-    ordering = ('-created',)
+    pagination_class = RecipePagination
+    ordering_fields = (
+        'created', 'name', 'cooking_time', 'favorites_count', 'in_carts_count',
+    )
+    ordering = ('-created', '-id')
+    cache_control = {'private': True, 'no_cache': True}
+    vary = ('Authorization',)
+    response_cache_setting = 'RECIPE_RESPONSE_CACHE'
+
+    def get_queryset(self):
+        user = self.request.user
+        return (
+            super().get_queryset()
+            .with_user_flags(user)
+            .with_related(user)
+        )
+
+    def get_cache_version(self):
+        version, updated = DataVersion.objects.get_version(
+            DataVersion.RECIPES
+        )
+        return f'{version}:{updated.timestamp() if updated else 0}'
+
+    def get_validators(self):
+        if self.action != 'retrieve':
+            return None
+        try:
+            state = Recipe.objects.get_state(
+                self.kwargs[self.lookup_field], self.request.user,
+            )
+        except ValueError:
+            return None
+        if state is None:
+            return None
+        # Favorites, counters, subscriptions and author edits do not move
+        # any timestamp, so only the ETag can tell whether a detail is
+        # still current.
+        return make_etag(*state), None
 
     def get_permissions(self):
         if self.action == 'create':
@@ -51,6 +188,8 @@ class RecipeViewSet(ModelViewSet):
             self.permission_classes = [permissions.IsAuthenticated]
         elif self.action == 'download_shopping_cart':
             self.permission_classes = [permissions.IsAuthenticated]
+        elif self.action in ('favorite_many', 'shopping_cart_many'):
+            self.permission_classes = [permissions.IsAuthenticated]
         return super().get_permissions()
 
     def get_serializer_class(self):
@@ -58,10 +197,26 @@ class RecipeViewSet(ModelViewSet):
             return RecipeShortSerializer
         elif self.action == 'shopping_cart':
             return RecipeShortSerializer
+        elif self.action in ('favorite_many', 'shopping_cart_many'):
+            return RecipeIdListSerializer
         return super().get_serializer_class()
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        self.refresh_instance(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.refresh_instance(serializer)
+
+    def refresh_instance(self, serializer):
+        """
+        Reload saved recipe through the prefetch plan, so that response
+        is rendered with a fixed number of queries.
+        """
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk
+        )
 
     @action(
         detail=True,
@@ -75,46 +230,16 @@ class RecipeViewSet(ModelViewSet):
         return operation[request.method](request, pk)
 
     def add_favorite(self, request, pk=None):
-        user_favorites, created = UserFavorites.objects.prefetch_related(
-            'recipes'
-        ).get_or_create(user=request.user)
-        recipe = get_object_or_404(Recipe, pk=pk)
-
-        if self.can_add_favorite(user_favorites, recipe, raise_exception=True):
-            user_favorites.recipes.add(recipe)
-
-        context = {'request': request}
-        serializer = self.get_serializer(
-            recipe,
-            context=context,
+        return self.add_to_collection(
+            FavoriteRecipe, pk, 'favorites_count',
+            _('Cannot add to favorites twice.'),
         )
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-    @staticmethod
-    def can_add_favorite(favorites, recipe, raise_exception=True):
-        if recipe in favorites.recipes.all():
-            if raise_exception:
-                raise ValidationError(_('Cannot add to favorites twice.'))
-            return False
-        return True
-
-    def remove_favorite(self, request, id=None):
-        favorites, created = UserFavorites.objects.prefetch_related(
-            'recipes'
-        ).get_or_create(user=request.user)
-        recipe = get_object_or_404(Recipe, id=id)
-
-        if self.can_remove_favorite(favorites, recipe, raise_exception=True):
-            favorites.recipes.remove(recipe)
-        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @staticmethod
-    def can_remove_favorite(favorites, recipe, raise_exception=True):
-        if recipe not in favorites.recipes.all():
-            if raise_exception:
-                raise ValidationError(_('Not a favorite recipe.'))
-            return False
-        return True
+    def remove_favorite(self, request, pk=None):
+        return self.remove_from_collection(
+            FavoriteRecipe, pk, 'favorites_count',
+            _('Not a favorite recipe.'),
+        )
 
     @action(
         detail=True,
@@ -129,86 +254,152 @@ class RecipeViewSet(ModelViewSet):
         return operation[request.method](request, pk)
 
     def add_to_shopping_cart(self, request, pk=None):
-        shopping_cart, created = UserShoppingCart.objects.prefetch_related(
-            'recipes'
-        ).get_or_create(user=request.user)
-        recipe = get_object_or_404(Recipe, pk=pk)
-
-        if self.can_add_to_shopping_cart(
-                shopping_cart, recipe, raise_exception=True
-        ):
-            shopping_cart.recipes.add(recipe)
+        return self.add_to_collection(
+            ShoppingCartRecipe, pk, 'in_carts_count',
+            _('Cannot add to shopping cart twice.'),
+        )
 
-        context = {'request': request}
-        serializer = self.get_serializer(
-            recipe,
-            context=context,
+    def remove_from_shopping_cart(self, request, pk=None):
+        return self.remove_from_collection(
+            ShoppingCartRecipe, pk, 'in_carts_count',
+            _('Not in shopping cart.'),
         )
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    @staticmethod
-    def can_add_to_shopping_cart(shopping_cart, recipe, raise_exception=True):
-        if recipe in shopping_cart.recipes.all():
-            if raise_exception:
-                raise ValidationError(_('Cannot add to shopping cart twice.'))
-            return False
-        return True
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='favorite',
+        url_name='favorite-many',
+    )
+    def favorite_many(self, request):
+        return self.change_collection(FavoriteRecipe, 'favorites_count')
 
-    def remove_from_shopping_cart(self, request, pk=None):
-        shopping_cart, created = UserShoppingCart.objects.prefetch_related(
-            'recipes'
-        ).get_or_create(user=request.user)
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='shopping_cart',
+        url_name='shopping-cart-many',
+    )
+    def shopping_cart_many(self, request):
+        return self.change_collection(ShoppingCartRecipe, 'in_carts_count')
+
+    def change_collection(self, model, counter):
+        """
+        Add (POST) or remove (DELETE) a list of recipes and report the
+        outcome for every id: one query checks which ids exist, one
+        statement inserts or deletes the links and returns the rows it
+        changed, and one moves the counters of those recipes.
+        """
+        serializer = self.get_serializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        user_id = self.request.user.pk
+        adding = self.request.method == 'POST'
+
+        with transaction.atomic():
+            existing = set(
+                Recipe.objects.filter(
+                    pk__in=recipe_ids,
+                ).values_list('pk', flat=True)
+            )
+            change = (
+                model.objects.add_many if adding
+                else model.objects.discard_many
+            )
+            changed = set(change(
+                user_id, [pk for pk in recipe_ids if pk in existing]
+            ))
+            if changed:
+                Recipe.objects.filter(pk__in=changed).increment(
+                    counter, 1 if adding else -1
+                )
+
+        done, unchanged = (
+            ('added', 'exists') if adding else ('removed', 'absent')
+        )
+        results = []
+        for pk in recipe_ids:
+            if pk not in existing:
+                outcome = 'not_found'
+            elif pk in changed:
+                outcome = done
+            else:
+                outcome = unchanged
+            results.append({'id': pk, 'status': outcome})
+        return Response({'results': results})
+
+    def add_to_collection(self, model, pk, counter, error):
+        """
+        Link recipe to the user's collection with a single conflict-ignoring
+        INSERT; the recipe counter moves only if a row was inserted.
+        """
         recipe = get_object_or_404(Recipe, pk=pk)
+        with transaction.atomic():
+            if not model.objects.add(self.request.user.pk, recipe.pk):
+                raise ValidationError(error)
+            Recipe.objects.filter(pk=recipe.pk).increment(counter)
 
-        if self.can_remove_from_shopping_cart(
-                shopping_cart, recipe, raise_exception=True
-        ):
-            shopping_cart.recipes.remove(recipe)
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        serializer = self.get_serializer(recipe)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    @staticmethod
-    def can_remove_from_shopping_cart(
-            shopping_cart, recipe, raise_exception=True
-    ):
-        if recipe not in shopping_cart.recipes.all():
-            if raise_exception:
-                raise ValidationError(_('Not in shopping cart.'))
-            return False
-        return True
+    def remove_from_collection(self, model, pk, counter, error):
+        """
+        Unlink recipe with a single DELETE; the recipe is only looked up
+        to tell a missing recipe from one not in the collection.
+        """
+        try:
+            recipe_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound()
+        with transaction.atomic():
+            removed = model.objects.discard(self.request.user.pk, recipe_id)
+            if removed:
+                Recipe.objects.filter(pk=recipe_id).increment(counter, -1)
+
+        if not removed:
+            get_object_or_404(Recipe, pk=recipe_id)
+            raise ValidationError(error)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=False,
         methods=('get',),
         url_name='download-shopping-cart',
+        renderer_classes=(JSONRenderer,),
+        content_negotiation_class=IgnoreClientContentNegotiation,
     )
     def download_shopping_cart(self, request):
+        # The format comes from the query param only, so that clients
+        # sending Accept: application/json still get the PDF.
+        export_format = request.query_params.get(
+            'format', DEFAULT_EXPORT_FORMAT
+        )
+        if export_format not in EXPORT_CONTENT_TYPES:
+            raise ParseError(
+                _('format query param must be one of: pdf, txt, csv.')
+            )
         user = request.user
         shopping_cart, created = UserShoppingCart.objects.get_or_create(
             user=user
         )
         ingredients = shopping_cart.get_ingredients_to_buy()
 
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer)
-        pdfmetrics.registerFont(TTFont('DejaVu Serif', 'DejaVuSerif.ttf'))
-        if ingredients:
-            table = Table(
-                ingredients,
-                hAlign='LEFT',
-                style=[
-                    ('FONT', (0, 0), (-1, -1), 'DejaVu Serif'),
-                    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-                    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                    ('ALIGN', (2, 0), (2, -1), 'LEFT'),
-                ]
+        if export_format == 'pdf':
+            pdf = get_shopping_list_pdf(list(ingredients), get_language())
+            return FileResponse(
+                io.BytesIO(pdf),
+                as_attachment=True,
+                filename='shopping_cart.pdf'
             )
-            doc.build([table])
-        else:
-            doc.build([Paragraph(_('Shopping cart is empty.'))])
-        buffer.seek(0)
 
-        return FileResponse(
-            buffer,
-            as_attachment=True,
-            filename='shopping_cart.pdf'
+        stream = {
+            'txt': iter_shopping_list_text,
+            'csv': iter_shopping_list_csv,
+        }[export_format](ingredients.iterator())
+        response = StreamingHttpResponse(
+            stream, content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{export_format}"'
         )
+        return response
@@ -6,3 +6,9 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
+
+# Tests run in a single process, local invalidation is enough and keeps
+# query counts deterministic.
+CATALOG_CACHE = {
+    'CHECK_INTERVAL': None,
+}
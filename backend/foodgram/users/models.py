@@ -17,6 +17,11 @@ class User(AbstractUser):
         verbose_name=_('Last name'),
         max_length=150,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name=_('Recipes count'),
+        default=0,
+        editable=False,
+    )
     follows = models.ManyToManyField(
         to='self',
         through='Follow',
@@ -12,7 +12,9 @@ class UserSerializer(DjoserUserSerializer):
         fields = DjoserUserSerializer.Meta.fields + ('is_subscribed',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context['request'].user
         if user.is_anonymous:
             return False
-        return obj in user.follows.all()
+        return user.follows.filter(pk=obj.pk).exists()
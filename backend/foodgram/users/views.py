@@ -1,5 +1,8 @@
+from django.db.models import BooleanField, Value
 from djoser.conf import settings
 from djoser.views import UserViewSet as DjoserUserViewSet
+from recipes.models import Recipe
+from recipes.serializers import get_recipes_limit
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
@@ -30,14 +33,17 @@ class UserViewSet(DjoserUserViewSet):
     )
     def subscriptions(self, request):
         current_user = request.user
-        queryset = current_user.follows.all()
+        queryset = current_user.follows.annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
+        page = self.paginate_queryset(queryset)
+        Recipe.objects.attach_to_authors(page, get_recipes_limit(request))
         context = {'request': request}
         serializer = self.get_serializer(
-            queryset,
+            page,
             context=context,
             many=True,
         )
-        self.paginate_queryset(queryset)
         return self.get_paginated_response(serializer.data)
 
     @action(